@@ -0,0 +1,10 @@
+from typing import Optional
+
+
+def callback_id(data: str) -> Optional[int]:
+    """
+    "cat:12" → 12. None for anything else, e.g. buttons still showing in
+    chats from before categories had ids ("cat:Food").
+    """
+    _, _, value = data.partition(":")
+    return int(value) if value.isascii() and value.isdecimal() else None
@@ -4,6 +4,8 @@ from .stats import router as stats_router
 from .settings import router as settings_router
 from .main_menu_handlers import router as main_menu_router
 from .history import router as history_router
+from .export import router as export_router
+from .imports import router as import_router
 from .echo import router as echo_router
 print("Loaded handlers package")
 
@@ -14,6 +16,8 @@ __all__ = [
     "settings_router",
     "main_menu_router",
     "history_router",
+    "export_router",
+    "import_router",
     "echo_router",
     
 ]
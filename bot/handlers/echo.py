@@ -1,8 +1,16 @@
-from aiogram import Router
+from aiogram import Router, F
 from aiogram.types import Message
 
 router = Router()
 
+
+# Plain text that no router above handled (not a menu button, typed in a
+# state that expects a button press, ...) is ignored, not echoed back
+@router.message(F.text)
+async def ignore_text(message: Message):
+    return
+
+
 @router.message()
 async def echo(message: Message):
     try:
@@ -1,10 +1,21 @@
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional
+
 from aiogram import Router, types, F
 from aiogram.filters import Command
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-from bot.handlers.settings import get_user_settings
+from bot.services.settings_cache import SettingsSnapshot
 from bot.i18n import t
+from bot.keyboard_cache import cached_keyboard
+from bot.callbacks import callback_id
+from bot.services.rollup import record_expense, apply_expense_delta
+from bot.services.limits import monthly_totals, crossed_threshold
+from bot.services.money import parse_amount, format_amount
+from sqlalchemy import insert
 from db.models import async_session, Expense   
 from db.models import User                   
 
@@ -15,29 +26,28 @@ router = Router()
 class ExpenseStates(StatesGroup):
     waiting_for_category = State()
     waiting_for_amount = State()
+    waiting_for_bulk = State()
 
 
 
 # ============ KEYBOARDS ============
 
-async def categories_keyboard(user_id: int):
-    settings = await get_user_settings(user_id)
-    lang = settings.language
-    cats = settings.categories.split(",")
-
+# Keyed by the categories tuple itself: when the user edits categories the
+# key changes and the old markup just ages out of the LRU
+@cached_keyboard(1024)
+def categories_keyboard(categories: tuple, lang: str):
     return InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text=cat, callback_data=f"cat:{cat}")]
-            for cat in cats
+            [InlineKeyboardButton(text=cat.name, callback_data=f"cat:{cat.id}")]
+            for cat in categories
         ] + [
             [InlineKeyboardButton(text=t(lang, "cancel"), callback_data="cancel")]
         ]
     )
 
 
-async def cancel_keyboard(user_id: int):
-    settings = await get_user_settings(user_id)
-    lang = settings.language
+@cached_keyboard()
+def cancel_keyboard(lang: str):
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [InlineKeyboardButton(text=t(lang, "cancel"), callback_data="cancel")]
@@ -45,13 +55,38 @@ async def cancel_keyboard(user_id: int):
     )
 
 
+# ============ LIMIT ============
+
+async def limit_warning(user_id: int, user_settings: SettingsSnapshot,
+                        amount: int, when: datetime, since: float) -> Optional[str]:
+    """
+    Adds a committed expense to the running month total, returns a warning if a threshold was crossed.
+    `since` is time.monotonic() taken before the expense was written.
+    """
+    if not user_settings.limit:
+        return None
+
+    before, after = await monthly_totals.add(user_id, amount, when, since)
+    share = crossed_threshold(user_settings.limit, before, after)
+    if share is None or not user_settings.notifications:
+        return None
+
+    return t(
+        user_settings.language,
+        "limit_exceeded" if share >= 1 else "limit_warning",
+        percent=int(share * 100),
+        total=format_amount(after),
+        limit=format_amount(user_settings.limit),
+        currency=user_settings.currency,
+    )
+
+
 # ============ HANDLERS ============
 
 @router.message(Command("add"))
-async def add_expense(message: types.Message, state: FSMContext):
-    settings = await get_user_settings(message.from_user.id)
-    lang = settings.language
-    keyboard = await categories_keyboard(message.from_user.id)
+async def add_expense(message: types.Message, state: FSMContext, user_settings: SettingsSnapshot):
+    lang = user_settings.language
+    keyboard = categories_keyboard(user_settings.categories, lang)
 
     await message.answer(
         t(lang, "choose_category"),
@@ -62,74 +97,177 @@ async def add_expense(message: types.Message, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("cat:") & ~F.data.endswith("add"))
-async def choose_category(callback: types.CallbackQuery, state: FSMContext):
+async def choose_category(callback: types.CallbackQuery, state: FSMContext, user_settings: SettingsSnapshot):
     """
     User has been choosen the category → saving that in FSM → waiting for the summa
     """
-    category = callback.data.split(":")[1]
-    settings = await get_user_settings(callback.from_user.id)
-    lang = settings.language
+    category_id = callback_id(callback.data)
+    lang = user_settings.language
+    category = user_settings.category_name(category_id) if category_id is not None else None
+
+    # Keyboard from before the category was deleted (or from before ids)
+    if category is None:
+        return await callback.answer(t(lang, "category_not_found"), show_alert=True)
 
-    await state.update_data(category=category)
+    await state.update_data(category_id=category_id, category=category)
 
     await callback.message.edit_text(
         f"{t(lang, 'category')}: *{category}*\n{t(lang, 'enter_amount')}",
         parse_mode="Markdown",
-        reply_markup=await cancel_keyboard(callback.from_user.id)
+        reply_markup=cancel_keyboard(lang)
     )
     await state.set_state(ExpenseStates.waiting_for_amount)
     await callback.answer()
 
 
 @router.message(ExpenseStates.waiting_for_amount)
-async def enter_amount(message: types.Message, state: FSMContext):
+async def enter_amount(message: types.Message, state: FSMContext, user_settings: SettingsSnapshot):
     """
     Step two: summa has been collected → saving in to db
     """
     text = message.text.strip()
-    settings = await get_user_settings(message.from_user.id)
-    lang = settings.language
+    lang = user_settings.language
 
-    # Checking of the wroted number
-    if not text.replace(".", "", 1).isdigit():
+    # Checking of the wroted number: "12.5" / "12,5", stored in minor units
+    amount = parse_amount(text)
+    if not amount:
         return await message.answer(
             t(lang, "enter_correct_number"),
-            reply_markup=await cancel_keyboard(message.from_user.id)
+            reply_markup=cancel_keyboard(lang)
         )
 
-    amount = float(text)
-
     # Getting data from FSM
     data = await state.get_data()
     category = data["category"]
 
     # Saving in to db
+    since = time.monotonic()
     async with async_session() as session:
         expense = Expense(
             user_id=message.from_user.id,
-            category=category,
-            amount=amount
+            category_id=data["category_id"],
+            amount=amount,
+            created_at=datetime.now()
         )
         session.add(expense)
+        await record_expense(session, expense)
         await session.commit()
 
     await state.clear()
 
     await message.answer(
-        t(lang, "expense_added", category=category, amount=amount),
+        t(lang, "expense_added", category=category, amount=format_amount(amount)),
         parse_mode="Markdown"
     )
 
+    warning = await limit_warning(message.from_user.id, user_settings, amount, expense.created_at, since)
+    if warning:
+        await message.answer(warning)
+
+
+# ============ BULK INPUT ============
+
+# One message can't be longer than 4096 chars anyway, this just keeps
+# a single INSERT reasonably sized
+BULK_MAX_LINES = 200
+
+
+def parse_bulk_expenses(text: str, categories: tuple):
+    """
+    Parses lines like `Food 12.5` in one pass.
+    Returns ([(category, amount), ...], [bad line numbers]).
+    """
+    by_name = {cat.name.casefold(): cat for cat in categories}
+    parsed, bad = [], []
+
+    for number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+
+        # The category name may contain spaces, the amount is the last word
+        name, _, amount = line.rpartition(" ")
+        category = by_name.get(name.strip().casefold())
+        amount = parse_amount(amount)
+        if category is None or not amount:
+            bad.append(number)
+            continue
+
+        parsed.append((category, amount))
+
+    return parsed, bad
+
+
+@router.message(Command("bulk"))
+async def bulk_start(message: types.Message, state: FSMContext, user_settings: SettingsSnapshot):
+    lang = user_settings.language
+    await state.set_state(ExpenseStates.waiting_for_bulk)
+    await message.answer(
+        t(lang, "bulk_prompt", categories=", ".join(user_settings.category_list)),
+        reply_markup=cancel_keyboard(lang)
+    )
+
+
+@router.message(ExpenseStates.waiting_for_bulk, F.text)
+async def bulk_enter(message: types.Message, state: FSMContext, user_settings: SettingsSnapshot):
+    lang = user_settings.language
+    lines = message.text.splitlines()
+
+    if len(lines) > BULK_MAX_LINES:
+        return await message.answer(
+            t(lang, "bulk_too_many", limit=BULK_MAX_LINES),
+            reply_markup=cancel_keyboard(lang)
+        )
+
+    parsed, bad = parse_bulk_expenses(message.text, user_settings.categories)
+    if not parsed:
+        return await message.answer(
+            t(lang, "bulk_nothing_parsed"),
+            reply_markup=cancel_keyboard(lang)
+        )
+
+    user_id = message.from_user.id
+    now = datetime.now()
+    rows = [
+        {"user_id": user_id, "category_id": cat.id, "amount": amount, "created_at": now}
+        for cat, amount in parsed
+    ]
+
+    # Rollup delta per category: all rows fall on the same day
+    totals = defaultdict(lambda: [0, 0])
+    for cat, amount in parsed:
+        totals[cat.id][0] += amount
+        totals[cat.id][1] += 1
+
+    # One multi-row INSERT + rollup in a single transaction
+    since = time.monotonic()
+    async with async_session() as session:
+        await session.execute(insert(Expense).values(rows))
+        for category_id, (total, count) in totals.items():
+            await apply_expense_delta(session, user_id, now.date(), category_id, total, count)
+        await session.commit()
+
+    await state.clear()
+
+    total = sum(amount for _, amount in parsed)
+    text = t(lang, "bulk_added", count=len(parsed), total=format_amount(total))
+    if bad:
+        text += "\n" + t(lang, "bulk_skipped", lines=", ".join(map(str, bad)))
+    await message.answer(text, parse_mode="Markdown")
+
+    warning = await limit_warning(user_id, user_settings, total, now, since)
+    if warning:
+        await message.answer(warning)
+
 
 # ============ CANCEL ============
 
 @router.callback_query(F.data == "cancel")
-async def cancel(callback: types.CallbackQuery, state: FSMContext):
+async def cancel(callback: types.CallbackQuery, state: FSMContext, user_settings: SettingsSnapshot):
     """
     Отмена на любом шаге
     """
-    settings = await get_user_settings(callback.from_user.id)
-    lang = settings.language
+    lang = user_settings.language
     await state.clear()
     await callback.message.edit_text(t(lang, "operation_cancelled"))
     await callback.answer()
@@ -0,0 +1,36 @@
+import os
+from datetime import date
+
+from aiogram import Router, types
+from aiogram.filters import Command, CommandObject
+from aiogram.types import FSInputFile
+
+from bot.i18n import t
+from bot.services.export import export_expenses, EXPORT_FORMATS
+from bot.services.settings_cache import SettingsSnapshot
+
+router = Router()
+
+
+# ============ EXPORT ============
+
+@router.message(Command("export"))
+async def export_cmd(message: types.Message, command: CommandObject, user_settings: SettingsSnapshot):
+    """/export or /export json"""
+    lang = user_settings.language
+    fmt = (command.args or "csv").strip().lower()
+
+    if fmt not in EXPORT_FORMATS:
+        return await message.answer(t(lang, "export_usage"))
+
+    path, count = await export_expenses(message.from_user.id, fmt)
+    try:
+        if count == 0:
+            return await message.answer(t(lang, "no_expenses"))
+
+        await message.answer_document(
+            FSInputFile(path, filename=f"expenses_{date.today().isoformat()}.{fmt}"),
+            caption=t(lang, "export_done", count=count),
+        )
+    finally:
+        os.remove(path)
@@ -1,13 +1,21 @@
+from dataclasses import dataclass
+from typing import Optional
+
 from aiogram import Router, types, F
 from aiogram.filters import Command
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-
 from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from db.models import async_session, Expense
 from bot.i18n import t
-from bot.handlers.settings import get_user_settings
+from bot.services.rollup import record_expense, apply_expense_delta
+from bot.services.limits import monthly_totals
+from bot.services.expense_rows import ExpenseRow, expense_rows_query, fetch_expense_rows, get_expense_row
+from bot.services.money import parse_amount, format_amount
+from bot.services.settings_cache import SettingsSnapshot
 
 
 router = Router()
@@ -34,18 +42,69 @@ def expense_actions_kb(exp_id: int, lang: str):
     )
 
 
-def history_keyboard(expenses, currency: str):
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(
-                    text=f"{e.category}: {e.amount:.2f}{currency}",
-                    callback_data=f"exp:{e.id}"
-                )
-            ]
-            for e in expenses
+def history_keyboard(page: "HistoryPage", currency: str, lang: str):
+    rows = [
+        [
+            InlineKeyboardButton(
+                text=f"{e.category}: {format_amount(e.amount)}{currency}",
+                callback_data=f"exp:{e.id}"
+            )
         ]
-    )
+        for e in page.expenses
+    ]
+
+    # Cursor = id of the edge row on the current page
+    nav = []
+    if page.has_older:
+        nav.append(InlineKeyboardButton(text=t(lang, "history_older"), callback_data=f"hist:older:{page.expenses[-1].id}"))
+    if page.has_newer:
+        nav.append(InlineKeyboardButton(text=t(lang, "history_newer"), callback_data=f"hist:newer:{page.expenses[0].id}"))
+    if nav:
+        rows.append(nav)
+
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+# =========================
+#    Keyset pagination
+# =========================
+
+PAGE_SIZE = 10
+
+
+@dataclass
+class HistoryPage:
+    expenses: list[ExpenseRow]  # newest first
+    has_older: bool = False
+    has_newer: bool = False
+
+
+async def fetch_history_page(user_id: int, before_id: Optional[int] = None,
+                             after_id: Optional[int] = None, limit: int = PAGE_SIZE) -> HistoryPage:
+    """
+    One page of history by keyset on Expense.id (no OFFSET).
+    before_id → older rows, after_id → newer rows, none → the latest page.
+    One extra row is fetched to know if there is anything further.
+    """
+    query = expense_rows_query(user_id)
+
+    if after_id is not None:
+        query = query.where(Expense.id > after_id).order_by(Expense.id.asc())
+    else:
+        if before_id is not None:
+            query = query.where(Expense.id < before_id)
+        query = query.order_by(Expense.id.desc())
+
+    expenses = await fetch_expense_rows(query.limit(limit + 1))
+
+    has_more = len(expenses) > limit
+    expenses = expenses[:limit]
+
+    if after_id is not None:
+        expenses.reverse()
+        return HistoryPage(expenses, has_older=True, has_newer=has_more)
+
+    return HistoryPage(expenses, has_older=has_more, has_newer=before_id is not None)
 
 
 # =========================
@@ -53,26 +112,18 @@ def history_keyboard(expenses, currency: str):
 # =========================
 
 @router.message(Command("history"))
-async def history_list(message: types.Message):
+async def history_list(message: types.Message, user_settings: SettingsSnapshot):
     user_id = message.from_user.id
-    settings = await get_user_settings(user_id)
-    lang = settings.language
+    lang = user_settings.language
 
-    async with async_session() as session:
-        result = await session.execute(
-            select(Expense)
-            .where(Expense.user_id == user_id)
-            .order_by(Expense.id.desc())
-            .limit(10)
-        )
-        expenses = result.scalars().all()
+    page = await fetch_history_page(user_id)
 
-    if not expenses:
+    if not page.expenses:
         return await message.answer(t(lang, "no_expenses"))
 
     await message.answer(
         t(lang, "history_title"),
-        reply_markup=history_keyboard(expenses, settings.currency)
+        reply_markup=history_keyboard(page, user_settings.currency, lang)
     )
 
 
@@ -81,20 +132,18 @@ async def history_list(message: types.Message):
 # =========================
 
 @router.callback_query(F.data.startswith("exp:"))
-async def expense_actions(callback: types.CallbackQuery, state: FSMContext):
+async def expense_actions(callback: types.CallbackQuery, state: FSMContext, user_settings: SettingsSnapshot):
     exp_id = int(callback.data.split(":")[1])
-    settings = await get_user_settings(callback.from_user.id)
-    lang = settings.language
+    lang = user_settings.language
 
-    async with async_session() as session:
-        expense = await session.get(Expense, exp_id)
+    expense = await get_expense_row(callback.from_user.id, exp_id)
 
     if not expense:
         return await callback.answer(t(lang, "expense_not_found_alert"), show_alert=True)
 
     text = (
         f"{t(lang, 'expense_category', category=expense.category)}\n"
-        f"{t(lang, 'expense_amount', amount=expense.amount, currency=settings.currency)}\n"
+        f"{t(lang, 'expense_amount', amount=format_amount(expense.amount), currency=user_settings.currency)}\n"
         f"{t(lang, 'expense_id', id=expense.id)}"
     )
 
@@ -109,17 +158,27 @@ async def expense_actions(callback: types.CallbackQuery, state: FSMContext):
 #     Deleting
 # =========================
 
+async def get_own_expense(session: AsyncSession, user_id: int, exp_id: int) -> Optional[Expense]:
+    """The expense for writing, only if it belongs to the user (ids come from callback data)."""
+    return await session.scalar(
+        select(Expense).where(Expense.id == exp_id, Expense.user_id == user_id)
+    )
+
+
 @router.callback_query(F.data.startswith("exp_del:"))
-async def delete_expense(callback: types.CallbackQuery):
+async def delete_expense(callback: types.CallbackQuery, user_settings: SettingsSnapshot):
     exp_id = int(callback.data.split(":")[1])
-    settings = await get_user_settings(callback.from_user.id)
-    lang = settings.language
+    lang = user_settings.language
 
     async with async_session() as session:
-        expense = await session.get(Expense, exp_id)
-        if expense:
-            await session.delete(expense)
-            await session.commit()
+        expense = await get_own_expense(session, callback.from_user.id, exp_id)
+        if not expense:
+            return await callback.answer(t(lang, "expense_not_found_alert"), show_alert=True)
+
+        await record_expense(session, expense, sign=-1)
+        await session.delete(expense)
+        await session.commit()
+        monthly_totals.adjust(expense.user_id, -expense.amount, expense.created_at)
 
     await callback.answer(t(lang, "deleted"))
     await callback.message.edit_text(t(lang, "expense_deleted"))
@@ -130,10 +189,12 @@ async def delete_expense(callback: types.CallbackQuery):
 # =========================
 
 @router.callback_query(F.data.startswith("exp_edit:"))
-async def edit_expense(callback: types.CallbackQuery, state: FSMContext):
+async def edit_expense(callback: types.CallbackQuery, state: FSMContext, user_settings: SettingsSnapshot):
     exp_id = int(callback.data.split(":")[1])
-    settings = await get_user_settings(callback.from_user.id)
-    lang = settings.language
+    lang = user_settings.language
+
+    if await get_expense_row(callback.from_user.id, exp_id) is None:
+        return await callback.answer(t(lang, "expense_not_found_alert"), show_alert=True)
 
     await state.update_data(exp_id=exp_id)
 
@@ -149,31 +210,36 @@ async def edit_expense(callback: types.CallbackQuery, state: FSMContext):
 
 
 @router.message(ExpenseEditStates.waiting_for_new_amount)
-async def save_new_amount(message: types.Message, state: FSMContext):
+async def save_new_amount(message: types.Message, state: FSMContext, user_settings: SettingsSnapshot):
     text = message.text.strip()
-    settings = await get_user_settings(message.from_user.id)
-    lang = settings.language
+    lang = user_settings.language
 
     # проверяем что число
-    if not text.replace(".", "", 1).isdigit():
+    new_amount = parse_amount(text)
+    if not new_amount:
         return await message.answer(t(lang, "enter_correct_number_short"))
-
-    new_amount = float(text)
     data = await state.get_data()
     exp_id = data["exp_id"]
 
     async with async_session() as session:
-        expense = await session.get(Expense, exp_id)
+        expense = await get_own_expense(session, message.from_user.id, exp_id)
 
         if not expense:
             await state.clear()
             return await message.answer(t(lang, "expense_not_found"))
 
+        if expense.created_at is not None:
+            await apply_expense_delta(
+                session, expense.user_id, expense.created_at.date(),
+                expense.category_id, new_amount - expense.amount, 0,
+            )
+        delta = new_amount - expense.amount
         expense.amount = new_amount
         await session.commit()
+        monthly_totals.adjust(expense.user_id, delta, expense.created_at)
 
     await state.clear()
-    await message.answer(t(lang, "amount_updated", amount=new_amount))
+    await message.answer(t(lang, "amount_updated", amount=format_amount(new_amount)))
 
 
 # =========================
@@ -181,29 +247,51 @@ async def save_new_amount(message: types.Message, state: FSMContext):
 # =========================
 
 @router.callback_query(F.data == "history_back")
-async def history_back(callback: types.CallbackQuery):
+async def history_back(callback: types.CallbackQuery, user_settings: SettingsSnapshot):
     user_id = callback.from_user.id
-    settings = await get_user_settings(user_id)
-    lang = settings.language
+    lang = user_settings.language
 
-    # downloading the last 10 expenses
-    async with async_session() as session:
-        result = await session.execute(
-            select(Expense)
-            .where(Expense.user_id == user_id)
-            .order_by(Expense.id.desc())
-            .limit(10)
-        )
-        expenses = result.scalars().all()
+    # downloading the last page of expenses
+    page = await fetch_history_page(user_id)
 
-    if not expenses:
+    if not page.expenses:
         await callback.message.edit_text(t(lang, "no_expenses"))
         return await callback.answer()
 
     # Getting back the menuu of the last expenses
     await callback.message.edit_text(
         t(lang, "history_title"),
-        reply_markup=history_keyboard(expenses, settings.currency)
+        reply_markup=history_keyboard(page, user_settings.currency, lang)
     )
 
     await callback.answer()
+
+
+# =========================
+#     Older/newer pages
+# =========================
+
+@router.callback_query(F.data.startswith("hist:"))
+async def history_page(callback: types.CallbackQuery, user_settings: SettingsSnapshot):
+    _, direction, cursor = callback.data.split(":")
+    user_id = callback.from_user.id
+    lang = user_settings.language
+
+    if direction == "older":
+        page = await fetch_history_page(user_id, before_id=int(cursor))
+    else:
+        page = await fetch_history_page(user_id, after_id=int(cursor))
+
+    # Rows around the cursor were deleted meanwhile — start from the top
+    if not page.expenses:
+        page = await fetch_history_page(user_id)
+
+    if not page.expenses:
+        await callback.message.edit_text(t(lang, "no_expenses"))
+        return await callback.answer()
+
+    await callback.message.edit_text(
+        t(lang, "history_title"),
+        reply_markup=history_keyboard(page, user_settings.currency, lang)
+    )
+    await callback.answer()
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import tempfile
+from contextlib import suppress
+
+from aiogram import Router, types, F
+from aiogram.exceptions import TelegramAPIError
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import StatesGroup, State
+
+from core.config import settings as config
+from bot.handlers.expenses import cancel_keyboard
+from bot.i18n import t
+from bot.services.importer import import_expenses, ImportFormatError, ImportResult
+from bot.services.limits import monthly_totals
+from bot.services.settings_cache import SettingsSnapshot
+
+router = Router()
+
+
+# ============ FSM STATES ============
+class ImportStates(StatesGroup):
+    waiting_for_file = State()
+
+
+# ============ HANDLERS ============
+
+@router.message(Command("import"))
+async def import_start(message: types.Message, state: FSMContext, user_settings: SettingsSnapshot):
+    lang = user_settings.language
+    await state.set_state(ImportStates.waiting_for_file)
+    await message.answer(
+        t(lang, "import_prompt", categories=", ".join(user_settings.category_list)),
+        reply_markup=cancel_keyboard(lang)
+    )
+
+
+@router.message(ImportStates.waiting_for_file, F.document)
+async def import_file(message: types.Message, state: FSMContext, user_settings: SettingsSnapshot):
+    lang = user_settings.language
+    document = message.document
+
+    if document.file_size and document.file_size > config.IMPORT_MAX_FILE_SIZE:
+        return await message.answer(
+            t(lang, "import_too_large", limit=config.IMPORT_MAX_FILE_SIZE // (1024 * 1024)),
+            reply_markup=cancel_keyboard(lang)
+        )
+
+    await state.clear()
+    progress = await message.answer(t(lang, "import_started"))
+
+    # The import only records its count; one message is edited in place, at
+    # most once per IMPORT_PROGRESS_INTERVAL, by a separate task, so the open
+    # transaction (and SQLite's write lock) never waits for Telegram
+    imported = 0
+
+    def on_progress(result: ImportResult):
+        nonlocal imported
+        imported = result.imported
+
+    async def report_progress():
+        shown = 0
+        while True:
+            await asyncio.sleep(config.IMPORT_PROGRESS_INTERVAL)
+            if imported != shown:
+                shown = imported
+                # A lost progress update isn't worth failing the import for
+                with suppress(TelegramAPIError):
+                    await progress.edit_text(t(lang, "import_progress", count=shown))
+
+    fd, path = tempfile.mkstemp(prefix=f"spender_import_{message.from_user.id}_", suffix=".csv")
+    os.close(fd)
+    reporter = None
+    try:
+        await message.bot.download(document, destination=path)
+        reporter = asyncio.create_task(report_progress())
+        result = await import_expenses(message.from_user.id, path, user_settings.categories, on_progress)
+    except (ImportFormatError, UnicodeDecodeError):
+        return await progress.edit_text(t(lang, "import_bad_format"))
+    except Exception:
+        # Nothing was imported (one transaction); don't leave "Import started…" hanging
+        await progress.edit_text(t(lang, "import_failed"))
+        raise
+    finally:
+        if reporter is not None:
+            reporter.cancel()
+        os.remove(path)
+
+    # Imported rows may fall on any month, the running total is reloaded
+    monthly_totals.invalidate(message.from_user.id)
+
+    text = t(lang, "import_done", count=result.imported)
+    if result.skipped:
+        text += "\n" + t(lang, "import_skipped", count=result.skipped,
+                         lines=", ".join(map(str, result.bad_lines)))
+    await progress.edit_text(text)
+
+
+@router.message(ImportStates.waiting_for_file)
+async def import_not_a_file(message: types.Message, user_settings: SettingsSnapshot):
+    lang = user_settings.language
+    await message.answer(t(lang, "import_send_file"), reply_markup=cancel_keyboard(lang))
@@ -1,81 +1,46 @@
+from typing import Optional
+
 from aiogram import Router, types, F
 from aiogram.fsm.context import FSMContext
 
-from bot.main_menu import main_menu
 from bot.handlers.expenses import add_expense
 from bot.handlers.settings import settings_cmd
 from bot.handlers.stats import stats_cmd
 from bot.handlers.history import history_list
-from bot.i18n import t
-from bot.handlers.settings import get_user_settings  
+from bot.i18n import catalog
+from bot.services.settings_cache import SettingsSnapshot
 
 router = Router()
 
 
-async def get_lang(user_id: int) -> str:
-    """Small helper to get language quickly."""
-    settings = await get_user_settings(user_id)
-    return settings.language
-
-
-@router.message(F.text)
-async def menu_router(message: types.Message, state: FSMContext):
-    settings = await get_user_settings(message.from_user.id)
-    lang = settings.language
-    text = message.text
-    
-    # Получаем все возможные тексты кнопок меню на обоих языках
-    menu_texts = [
-        t(lang, "menu_add_expense"),
-        t(lang, "menu_stats"),
-        t(lang, "menu_history"),
-        t(lang, "menu_settings"),
-    ]
-    
-    other_lang = "en" if lang == "ru" else "ru"
-    menu_texts.extend([
-        t(other_lang, "menu_add_expense"),
-        t(other_lang, "menu_stats"),
-        t(other_lang, "menu_history"),
-        t(other_lang, "menu_settings"),
-    ])
-    
-    # Если это не кнопка меню, и пользователь в FSM состоянии - пропускаем
-    current_state = await state.get_state()
-    if current_state is not None and text not in menu_texts:
-        return  # Позволяем другим обработчикам обработать это сообщение
-    
-    # Если это кнопка меню и пользователь в FSM состоянии - очищаем состояние
-    if current_state is not None and text in menu_texts:
-        await state.clear()
-    
-    # Проверяем текст кнопок на текущем языке
-    if text == t(lang, "menu_add_expense"):
-        return await add_expense(message, state)
-
-    if text == t(lang, "menu_stats"):
-        return await stats_cmd(message)
+# Translation key of a menu button → what it opens
+MENU_ACTIONS = {
+    "menu_add_expense": lambda message, state, settings: add_expense(message, state, settings),
+    "menu_stats": lambda message, state, settings: stats_cmd(message, settings),
+    "menu_history": lambda message, state, settings: history_list(message, settings),
+    "menu_settings": lambda message, state, settings: settings_cmd(message, settings),
+}
 
-    if text == t(lang, "menu_history"):
-        return await history_list(message)
+# Button label in every loaded language → action. Filled once per language
+# when the catalog compiles it (built-in ones at import). A user whose reply
+# keyboard is still in the old language is routed the same way.
+MENU_LOOKUP = {}
 
-    if text == t(lang, "menu_settings"):
-        return await settings_cmd(message)
-    
-    # Проверяем текст кнопок на другом языке (на случай, если меню еще не обновилось)
-    if text == t(other_lang, "menu_add_expense"):
-        return await add_expense(message, state)
 
-    if text == t(other_lang, "menu_stats"):
-        return await stats_cmd(message)
+def _add_menu_labels(lang: str, table: dict):
+    for key, action in MENU_ACTIONS.items():
+        if key in table:
+            MENU_LOOKUP[table[key]] = action
 
-    if text == t(other_lang, "menu_history"):
-        return await history_list(message)
 
-    if text == t(other_lang, "menu_settings"):
-        return await settings_cmd(message)
+catalog.on_load(_add_menu_labels)
 
 
-#text = t(lang, "add_expense")
-#await message.answer(text)
+@router.message(F.text.in_(MENU_LOOKUP))
+async def menu_router(message: types.Message, state: FSMContext, user_settings: SettingsSnapshot,
+                      raw_state: Optional[str] = None):
+    # Menu button pressed in the middle of a flow → the flow is abandoned
+    if raw_state is not None:
+        await state.clear()
 
+    return await MENU_LOOKUP[message.text](message, state, user_settings)
@@ -1,17 +1,29 @@
+from typing import Optional
+
 from aiogram import Router, types, F
 from aiogram.filters import Command
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from sqlalchemy import select
-from db.models import async_session, UserSettings, Expense
+from sqlalchemy import select, update, func, and_
+from db.models import async_session, UserSettings, Category, Expense
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 from bot.i18n import t
+from bot.keyboard_cache import cached_keyboard
+from bot.callbacks import callback_id
+from bot.services.settings_cache import settings_cache, SettingsSnapshot
+from bot.services.rollup import clear_user_totals
+from bot.services.limits import monthly_totals
+from bot.services.money import parse_amount, format_amount
 
 # FSM for categories adding
 class CategoryStates(StatesGroup):
     waiting_for_new_category = State()
 
 
+class LimitStates(StatesGroup):
+    waiting_for_limit = State()
+
+
 router = Router()
 
 CURRENCIES = ["Br", "$", "€", "₾", "£", "₽"]
@@ -21,11 +33,16 @@ CURRENCIES = ["Br", "$", "€", "₾", "£", "₽"]
 # 📂 Category keyboards
 # ---------------------
 
-def categories_menu(categories: list, lang: str):
+# Keyboards are cached per language (and per categories tuple for the
+# categories menu); a changed category list is a new key, so nothing has to
+# be invalidated by hand
+
+@cached_keyboard(1024)
+def categories_menu(categories: tuple, lang: str):
     """Categories menu"""
     return InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text=f"❌ {c}", callback_data=f"cat_del:{c}")] for c in categories
+            [InlineKeyboardButton(text=f"❌ {c.name}", callback_data=f"cat_del:{c.id}")] for c in categories
         ] + [
             [InlineKeyboardButton(text=t(lang, "add_category"), callback_data="cat:add")],
             [InlineKeyboardButton(text=t(lang, "back"), callback_data="settings:main")]
@@ -37,6 +54,7 @@ def categories_menu(categories: list, lang: str):
 # 🔧 Settings buttons
 # ---------------------
 
+@cached_keyboard()
 def currency_keyboard(lang="ru"):
     """Currency menu."""
     return InlineKeyboardMarkup(
@@ -49,6 +67,7 @@ def currency_keyboard(lang="ru"):
     )
 
 
+@cached_keyboard()
 def settings_menu(lang="ru"):
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -75,62 +94,140 @@ def settings_menu(lang="ru"):
     )
 
 
+@cached_keyboard()
+def clear_expenses_keyboard(lang: str):
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text=t(lang, "delete_all"), callback_data="confirm_clear_expenses")],
+            [InlineKeyboardButton(text=t(lang, "back"), callback_data="settings:main")]
+        ]
+    )
+
+
+@cached_keyboard()
+def language_keyboard(lang: str):
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text="🇷🇺 Русский", callback_data="lang:ru")],
+            [InlineKeyboardButton(text="🇬🇧 English", callback_data="lang:en")],
+            [InlineKeyboardButton(text=t(lang, "back"), callback_data="settings:main")],
+        ]
+    )
+
+
 # ---------------------
 # 📌 Getting/creating settings
 # ---------------------
 
-async def get_user_settings(user_id: int):
+DEFAULT_CATEGORIES = ["Food", "Transport", "Coffee", "Gifts", "Other"]
+
+
+def default_user_settings(user_id: int) -> UserSettings:
+    return UserSettings(
+        user_id=user_id,
+        currency="$",
+        limit=None,
+        notifications=True,
+        language="en"
+    )
+
+
+def default_categories(user_id: int) -> list[Category]:
+    return [
+        Category(user_id=user_id, name=name, position=i)
+        for i, name in enumerate(DEFAULT_CATEGORIES)
+    ]
+
+
+async def load_settings_snapshot(session, user_id: int) -> Optional[SettingsSnapshot]:
+    """Settings + active categories in one query, None if the user has no settings yet."""
+    result = await session.execute(
+        select(UserSettings, Category)
+        .outerjoin(Category, and_(Category.user_id == UserSettings.user_id, Category.is_active.is_(True)))
+        .where(UserSettings.user_id == user_id)
+        .order_by(Category.position, Category.id)
+    )
+    rows = result.all()
+    if not rows:
+        return None
+
+    return SettingsSnapshot.from_model(rows[0][0], [c for _, c in rows if c is not None])
+
+
+async def get_user_settings(user_id: int) -> SettingsSnapshot:
+    cached = settings_cache.get(user_id)
+    if cached:
+        return cached
+
     async with async_session() as session:
-        result = await session.execute(
-            select(UserSettings).where(UserSettings.user_id == user_id)
-        )
-        settings = result.scalar()
-
-        if settings:
-            return settings
-
-        # Creating default settings
-        settings = UserSettings(
-            user_id=user_id,
-            currency="$",
-            categories="Food,Transport,Coffee,Gifts,Other",
-            limit=None,
-            notifications=True,
-            language="en"
-        )
-        session.add(settings)
+        snapshot = await load_settings_snapshot(session, user_id)
+
+        if snapshot is None:
+            # Creating default settings
+            settings = default_user_settings(user_id)
+            categories = default_categories(user_id)
+            session.add(settings)
+            session.add_all(categories)
+            await session.commit()
+            snapshot = SettingsSnapshot.from_model(settings, categories)
+
+    return settings_cache.put(snapshot)
+
+
+async def update_user_settings(user_id: int, **values) -> SettingsSnapshot:
+    """Write-through update: saves the fields and refreshes the cached snapshot."""
+    current = await get_user_settings(user_id)
+
+    async with async_session() as session:
+        settings = await session.get(UserSettings, user_id)
+        for field, value in values.items():
+            setattr(settings, field, value)
         await session.commit()
-        return settings
+
+    return settings_cache.put(SettingsSnapshot.from_model(settings, current.categories))
 
 
 # ---------------------
 # 📂 Category handlers
 # ---------------------
 
-async def add_category(user_id: int, new_cat: str):
+async def add_category(user_id: int, new_cat: str) -> SettingsSnapshot:
+    new_cat = new_cat[:50]
+
     async with async_session() as session:
-        result = await session.execute(select(UserSettings).where(UserSettings.user_id == user_id))
-        settings = result.scalar()
-        cats = settings.categories.split(",")
+        result = await session.execute(
+            select(Category).where(Category.user_id == user_id, Category.name == new_cat)
+        )
+        category = result.scalar()
 
-        if new_cat not in cats:
-            cats.append(new_cat)
-            settings.categories = ",".join(cats)
-            session.add(settings)
+        if category is None:
+            position = await session.scalar(
+                select(func.coalesce(func.max(Category.position) + 1, 0)).where(Category.user_id == user_id)
+            )
+            session.add(Category(user_id=user_id, name=new_cat, position=position))
+            await session.commit()
+        elif not category.is_active:
+            # Same name again → bring the old one back, with its expenses
+            category.is_active = True
             await session.commit()
 
+        snapshot = await load_settings_snapshot(session, user_id)
+
+    return settings_cache.put(snapshot)
 
-async def delete_category(user_id: int, cat: str):
+
+async def delete_category(user_id: int, category_id: int) -> SettingsSnapshot:
     async with async_session() as session:
-        result = await session.execute(select(UserSettings).where(UserSettings.user_id == user_id))
-        settings = result.scalar()
-        cats = settings.categories.split(",")
+        await session.execute(
+            update(Category)
+            .where(Category.id == category_id, Category.user_id == user_id)
+            .values(is_active=False)
+        )
+        await session.commit()
 
-        if cat in cats:
-            cats.remove(cat)
-            settings.categories = ",".join(cats)
-            session.add(settings)
-            await session.commit()
+        snapshot = await load_settings_snapshot(session, user_id)
+
+    return settings_cache.put(snapshot)
 
 
 # ---------------------
@@ -138,13 +235,13 @@ async def delete_category(user_id: int, cat: str):
 # ---------------------
 
 @router.message(Command("settings"))
-async def settings_cmd(message: types.Message):
-    settings = await get_user_settings(message.from_user.id)
+async def settings_cmd(message: types.Message, user_settings: SettingsSnapshot):
+    lang = user_settings.language
 
     await message.answer(
-        t(settings.language, "settings_title"),
+        t(lang, "settings_title"),
         parse_mode="HTML",
-        reply_markup=settings_menu(settings.language)
+        reply_markup=settings_menu(lang)
     )
 
 
@@ -153,15 +250,17 @@ async def settings_cmd(message: types.Message):
 # ---------------------
 
 @router.callback_query(F.data.startswith("settings:"))
-async def settings_callback(callback: CallbackQuery):
+async def settings_callback(callback: CallbackQuery, state: FSMContext, user_settings: SettingsSnapshot):
     action = callback.data.split(":")[1]
-    settings = await get_user_settings(callback.from_user.id)
+    settings = user_settings
     lang = settings.language
 
     if action == "back":
         return await callback.message.edit_text(t(lang, "back"))
 
     if action == "main":
+        # "Back" from the limit prompt
+        await state.clear()
         return await callback.message.edit_text(
             t(lang, "settings_title"),
             parse_mode="HTML",
@@ -176,49 +275,42 @@ async def settings_callback(callback: CallbackQuery):
         )
 
     if action == "categories":
-        cats = settings.categories.split(",")
         return await callback.message.edit_text(
             t(lang, "your_categories"),
             parse_mode="HTML",
-            reply_markup=categories_menu(cats, lang)
+            reply_markup=categories_menu(settings.categories, lang)
         )
 
     if action == "limit":
+        current = (
+            t(lang, "limit_current", limit=format_amount(settings.limit), currency=settings.currency)
+            if settings.limit else t(lang, "limit_not_set")
+        )
+        await state.set_state(LimitStates.waiting_for_limit)
         return await callback.message.edit_text(
-            t(lang, "limit_coming_soon"),
-            reply_markup=settings_menu(lang)
+            f"{current}\n\n{t(lang, 'enter_limit')}",
+            reply_markup=InlineKeyboardMarkup(
+                inline_keyboard=[[InlineKeyboardButton(text=t(lang, "back"), callback_data="settings:main")]]
+            )
         )
 
     if action == "clear_expenses":
         return await callback.message.edit_text(
             t(lang, "clear_expenses_confirm"),
-            reply_markup=InlineKeyboardMarkup(
-                inline_keyboard=[
-                    [InlineKeyboardButton(text=t(lang, "delete_all"), callback_data="confirm_clear_expenses")],
-                    [InlineKeyboardButton(text=t(lang, "back"), callback_data="settings:main")]
-                ]
-            )
+            reply_markup=clear_expenses_keyboard(lang)
         )
 
     if action == "language":
         return await callback.message.edit_text(
             t(lang, "choose_language"),
             parse_mode="HTML",
-            reply_markup=InlineKeyboardMarkup(
-                inline_keyboard=[
-                    [InlineKeyboardButton(text="🇷🇺 Русский", callback_data="lang:ru")],
-                    [InlineKeyboardButton(text="🇬🇧 English", callback_data="lang:en")],
-                    [InlineKeyboardButton(text=t(lang, "back"), callback_data="settings:main")],
-                ]
-            )
+            reply_markup=language_keyboard(lang)
         )
 
     if action == "notifications":
-        settings.notifications = not settings.notifications
-
-        async with async_session() as session:
-            session.add(settings)
-            await session.commit()
+        settings = await update_user_settings(
+            callback.from_user.id, notifications=not settings.notifications
+        )
 
         status = t(lang, "notifications_on") if settings.notifications else t(lang, "notifications_off")
 
@@ -239,13 +331,8 @@ async def settings_callback(callback: CallbackQuery):
 async def choose_currency(callback: CallbackQuery):
     symbol = callback.data.split(":")[1]
 
-    settings = await get_user_settings(callback.from_user.id)
+    settings = await update_user_settings(callback.from_user.id, currency=symbol)
     lang = settings.language
-    settings.currency = symbol
-
-    async with async_session() as session:
-        session.add(settings)
-        await session.commit()
 
     await callback.message.edit_text(
         f"{t(lang, 'currency')}: <b>{symbol}</b>",
@@ -255,32 +342,61 @@ async def choose_currency(callback: CallbackQuery):
     await callback.answer()
 
 
+# ---------------------
+# ⚠️ Spending limit
+# ---------------------
+
+@router.message(LimitStates.waiting_for_limit)
+async def set_limit(message: types.Message, state: FSMContext, user_settings: SettingsSnapshot):
+    text = (message.text or "").strip()
+    lang = user_settings.language
+
+    limit = parse_amount(text)
+    if limit is None:
+        return await message.answer(t(lang, "enter_correct_number_short"))
+
+    # 0 removes the limit
+    limit = limit or None
+    settings = await update_user_settings(message.from_user.id, limit=limit)
+    await state.clear()
+
+    # Totals are not tracked while there is no limit, start from the DB again
+    monthly_totals.invalidate(message.from_user.id)
+
+    status = (
+        t(lang, "limit_set", limit=format_amount(limit), currency=settings.currency)
+        if limit else t(lang, "limit_removed")
+    )
+    await message.answer(status, reply_markup=settings_menu(lang))
+
+
 # ---------------------
 # 💱 Categories add/del
 # ---------------------
 
 @router.callback_query(F.data.startswith("cat_del:"))
-async def delete_cat_cb(callback: CallbackQuery):
-    cat = callback.data.split(":")[1]
+async def delete_cat_cb(callback: CallbackQuery, user_settings: SettingsSnapshot):
+    category_id = callback_id(callback.data)
     user_id = callback.from_user.id
 
-    await delete_category(user_id, cat)
-    settings = await get_user_settings(user_id)
+    # Keyboard from before categories had ids
+    if category_id is None:
+        return await callback.answer(t(user_settings.language, "category_not_found"), show_alert=True)
+
+    settings = await delete_category(user_id, category_id)
     lang = settings.language
-    cats = settings.categories.split(",")
 
     await callback.message.edit_text(
         t(lang, "categories"),
         parse_mode="HTML",
-        reply_markup=categories_menu(cats, lang)
+        reply_markup=categories_menu(settings.categories, lang)
     )
     await callback.answer()
 
 
 @router.callback_query(F.data == "cat:add")
-async def add_cat_start(callback: CallbackQuery, state: FSMContext):
-    settings = await get_user_settings(callback.from_user.id)
-    lang = settings.language
+async def add_cat_start(callback: CallbackQuery, state: FSMContext, user_settings: SettingsSnapshot):
+    lang = user_settings.language
 
     await callback.message.edit_text(t(lang, "enter_new_category"))
     await state.set_state(CategoryStates.waiting_for_new_category)
@@ -291,32 +407,32 @@ async def add_cat_start(callback: CallbackQuery, state: FSMContext):
 async def add_cat_text(message: types.Message, state: FSMContext):
     new_cat = message.text.strip()
 
-    await add_category(message.from_user.id, new_cat)
+    settings = await add_category(message.from_user.id, new_cat)
     await state.clear()
 
-    settings = await get_user_settings(message.from_user.id)
     lang = settings.language
-    cats = settings.categories.split(",")
 
     await message.answer(
         t(lang, "category_added", new_cat=new_cat),
         parse_mode="HTML",
-        reply_markup=categories_menu(cats, lang),
+        reply_markup=categories_menu(settings.categories, lang),
     )
 
 
 @router.callback_query(F.data == "confirm_clear_expenses")
-async def clear_all_expenses(callback: CallbackQuery):
+async def clear_all_expenses(callback: CallbackQuery, user_settings: SettingsSnapshot):
     user_id = callback.from_user.id
-    settings = await get_user_settings(user_id)
-    lang = settings.language
+    lang = user_settings.language
 
     async with async_session() as session:
         await session.execute(
             Expense.__table__.delete().where(Expense.user_id == user_id)
         )
+        await clear_user_totals(session, user_id)
         await session.commit()
 
+    monthly_totals.invalidate(user_id)
+
     await callback.message.edit_text(
         t(lang, "all_expenses_deleted"),
         reply_markup=settings_menu(lang)
@@ -331,12 +447,7 @@ async def clear_all_expenses(callback: CallbackQuery):
 @router.callback_query(F.data.startswith("lang:"))
 async def set_language(callback: CallbackQuery):
     lang = callback.data.split(":")[1]
-    settings = await get_user_settings(callback.from_user.id)
-    settings.language = lang
-
-    async with async_session() as session:
-        session.add(settings)
-        await session.commit()
+    await update_user_settings(callback.from_user.id, language=lang)
 
     await callback.message.edit_text(
         f"{t(lang, 'language')}: {'Русский 🇷🇺' if lang=='ru' else 'English 🇬🇧'}",
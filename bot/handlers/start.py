@@ -1,44 +1,16 @@
 from aiogram import Router, types, html
 from aiogram.filters import CommandStart
-from db.models import async_session, User
 from bot.main_menu import main_menu
 from bot.i18n import t
-from bot.handlers.settings import get_user_settings
+from bot.services.settings_cache import SettingsSnapshot
 
 router = Router()
 
-async def get_or_create_user(telegram_id, username, firstname, lastname):
-    async with async_session() as session:
-        user = await session.get(User, telegram_id)
-        if user:
-            return user
-
-        user = User(
-            telegram_id=telegram_id,
-            username=username,
-            firstname=firstname or "",
-            lastname=lastname or "",
-            is_active=True
-        )
-        session.add(user)
-        await session.commit()
-        return user
-
-
 @router.message(CommandStart())
-async def command_start(message: types.Message):
+async def command_start(message: types.Message, user_settings: SettingsSnapshot):
+    # User and settings rows are created by UserContextMiddleware
     tg = message.from_user
-
-    await get_or_create_user(
-        telegram_id=tg.id,
-        username=tg.username,
-        firstname=tg.first_name,
-        lastname=tg.last_name
-    )
-
-
-    settings = await get_user_settings(tg.id)
-    lang = settings.language
+    lang = user_settings.language
 
     await message.answer(
         t(lang, "start", name=tg.first_name or "друг"),
@@ -1,18 +1,39 @@
 from aiogram import Router, types, F
 from aiogram.filters import Command
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from sqlalchemy import select
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import StatesGroup, State
 import datetime
-from db.models import async_session, Expense, UserSettings
+from typing import Optional
 from bot.i18n import t
-from bot.handlers.settings import get_user_settings
+from bot.keyboard_cache import cached_keyboard
+from bot.services.settings_cache import SettingsSnapshot
+from bot.services.stats_service import get_period_stats, get_rollup_stats, period_start
+from bot.services.period_index import period_index_cache, rolling_window, month_over_month
+from bot.services.money import format_amount
+from bot.services.stats_format import render_category_stats, render_daily_dynamics
 
 router = Router()
 
+# Periods starting at midnight can be answered from the daily totals rollup
+ROLLUP_PERIODS = ("day", "week", "month", "year")
+
+# stats:<key> → window length in days
+ROLLING_WINDOWS = {"30d": 30, "90d": 90}
+
+RANGE_DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y")
+# Keeps the range and the previous one of the same length inside date's limits
+RANGE_YEARS = range(1970, 2101)
+
+
+class StatsStates(StatesGroup):
+    waiting_for_range = State()
+
 # ======================================================
 #                    UI BUTTONS
 # ======================================================
 
+@cached_keyboard()
 def stats_menu_kb(lang: str):
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -24,10 +45,19 @@ def stats_menu_kb(lang: str):
                 InlineKeyboardButton(text=t(lang, "stats_month"), callback_data="stats:month"),
                 InlineKeyboardButton(text=t(lang, "stats_year"), callback_data="stats:year")
             ],
+            [
+                InlineKeyboardButton(text=t(lang, "stats_30d"), callback_data="stats:30d"),
+                InlineKeyboardButton(text=t(lang, "stats_90d"), callback_data="stats:90d")
+            ],
+            [
+                InlineKeyboardButton(text=t(lang, "stats_mom"), callback_data="stats:mom"),
+                InlineKeyboardButton(text=t(lang, "stats_range"), callback_data="stats:range")
+            ],
         ]
     )
 
 
+@cached_keyboard()
 def back_kb(lang: str):
     return InlineKeyboardMarkup(
         inline_keyboard=[[InlineKeyboardButton(text=t(lang, "back"), callback_data="stats:back")]]
@@ -35,91 +65,61 @@ def back_kb(lang: str):
 
 
 # ======================================================
-#                 GRAPH (ASCII)
-# ======================================================
-
-def bar_chart(value, max_value, length=15):
-    if max_value == 0:
-        return ""
-    filled = int((value / max_value) * length)
-    return "█" * filled + "░" * (length - filled)
-
-
-# ======================================================
-#        Display stats by categories
+#        Rolling windows and ranges (prefix sums)
 # ======================================================
 
-def render_category_stats(expenses, currency, lang: str):
-    categories = {}
-    for e in expenses:
-        categories[e.category] = categories.get(e.category, 0) + e.amount
-
-    if not categories:
-        return t(lang, "no_data")
-
-    max_value = max(categories.values())
-    lines = [t(lang, "stats_by_categories"), ""]
-
-    for name, value in categories.items():
-        bar = bar_chart(value, max_value)
-        lines.append(f"{name}: `{bar}` — *{value:.2f}{currency}*")
-
-    return "\n".join(lines)
-
-
-# ======================================================
-#        Dynamic of the expenses by dates
-# ======================================================
-
-def render_daily_dynamics(expenses, currency, lang: str):
-    days = {}
-    for e in expenses:
-        d = e.created_at.date()
-        days[d] = days.get(d, 0) + e.amount
-
-    if not days:
-        return t(lang, "no_data")
-
-    max_value = max(days.values())
-    lines = [t(lang, "stats_dynamics"), ""]
-
-    for date, value in sorted(days.items()):
-        bar = bar_chart(value, max_value)
-        lines.append(f"{date}: `{bar}` {value:.2f}{currency}")
-
-    return "\n".join(lines)
+def change_label(current: int, previous: int) -> str:
+    if not previous:
+        return "—"
+    return f"{(current - previous) / previous * 100:+.0f}%"
+
+
+def render_rolling(days: int, current, previous, currency, lang: str):
+    return t(
+        lang, "stats_rolling",
+        days=days,
+        total=format_amount(current.total),
+        count=current.count,
+        per_day=format_amount(round(current.total / days)),
+        prev_total=format_amount(previous.total),
+        change=change_label(current.total, previous.total),
+        currency=currency,
+    )
 
 
-# ======================================================
-#         Getting the data by periods of time
-# ======================================================
+def render_month_over_month(current, previous, last_month, currency, lang: str):
+    return t(
+        lang, "stats_mom_text",
+        total=format_amount(current.total),
+        count=current.count,
+        prev_total=format_amount(previous.total),
+        change=change_label(current.total, previous.total),
+        last_month=format_amount(last_month.total),
+        currency=currency,
+    )
 
-async def get_expenses_by_period(user_id: int, period: str):
-    now = datetime.datetime.now()
 
-    if period == "day":
-        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+def parse_date_range(text: str) -> Optional[tuple[datetime.date, datetime.date]]:
+    """"2024-01-01 2024-03-31" / "01.01.2024 - 31.03.2024" → (start, end), end inclusive."""
+    parts = [p for p in text.replace("—", " ").split() if p != "-"]
+    if len(parts) != 2:
+        return None
 
-    elif period == "week":
-        start = now - datetime.timedelta(days=now.weekday())
+    dates = []
+    for part in parts:
+        for fmt in RANGE_DATE_FORMATS:
+            try:
+                dates.append(datetime.datetime.strptime(part, fmt).date())
+                break
+            except ValueError:
+                continue
+        else:
+            return None
 
-    elif period == "month":
-        start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-    elif period == "year":
-        start = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-
-    else:
-        start = now - datetime.timedelta(days=7)
-
-    async with async_session() as session:
-        result = await session.execute(
-            select(Expense).where(
-                Expense.user_id == user_id,
-                Expense.created_at >= start
-            )
-        )
-        return result.scalars().all(), start, now
+    start, end = sorted(dates)
+    if start.year not in RANGE_YEARS or end.year not in RANGE_YEARS:
+        return None
+    return start, end
 
 
 # ======================================================
@@ -127,9 +127,8 @@ async def get_expenses_by_period(user_id: int, period: str):
 # ======================================================
 
 @router.message(Command("stats"))
-async def stats_cmd(message: types.Message):
-    settings = await get_user_settings(message.from_user.id)
-    lang = settings.language
+async def stats_cmd(message: types.Message, user_settings: SettingsSnapshot):
+    lang = user_settings.language
     
     await message.answer(
         t(lang, "stats_choose_period"),
@@ -143,40 +142,62 @@ async def stats_cmd(message: types.Message):
 # ======================================================
 
 @router.callback_query(F.data.startswith("stats:"))
-async def stats_period(callback: types.CallbackQuery):
+async def stats_period(callback: types.CallbackQuery, state: FSMContext, user_settings: SettingsSnapshot):
     period = callback.data.split(":")[1]
-    settings = await get_user_settings(callback.from_user.id)
-    lang = settings.language
-    currency = settings.currency
+    lang = user_settings.language
+    currency = user_settings.currency
 
     # Вернуться в меню
     if period == "back":
+        await state.clear()
         return await callback.message.edit_text(
             t(lang, "stats_period"),
             reply_markup=stats_menu_kb(lang),
             parse_mode="Markdown"
         )
 
+    if period == "range":
+        await state.set_state(StatsStates.waiting_for_range)
+        return await callback.message.edit_text(t(lang, "stats_enter_range"), reply_markup=back_kb(lang))
+
     user_id = callback.from_user.id
+    now = datetime.datetime.now()
+
+    # Windows relative to today are answered from the cached prefix sums
+    if period in ROLLING_WINDOWS or period == "mom":
+        index = await period_index_cache.get(user_id)
+        if period == "mom":
+            text = render_month_over_month(*month_over_month(index, now.date()), currency, lang)
+        else:
+            days = ROLLING_WINDOWS[period]
+            text = render_rolling(days, *rolling_window(index, days, now.date()), currency, lang)
+
+        await callback.message.edit_text(text, parse_mode="Markdown", reply_markup=back_kb(lang))
+        return await callback.answer()
 
-    expenses, start, now = await get_expenses_by_period(user_id, period)
+    start = period_start(period, now)
 
-    if not expenses:
+    # Aggregated in SQL, so the payload doesn't grow with the number of expenses
+    if period in ROLLUP_PERIODS:
+        stats = await get_rollup_stats(user_id, start.date())
+    else:
+        stats = await get_period_stats(user_id, start)
+
+    if not stats.count:
         return await callback.message.edit_text(
             t(lang, "no_data_period"),
             reply_markup=back_kb(lang)
         )
 
-    total = sum(e.amount for e in expenses)
-    avg = total / len(expenses)
+    avg = round(stats.total / stats.count)
 
     text = (
         f"{t(lang, 'stats_period_label')} `{start.date()} — {now.date()}`\n"
-        f"{t(lang, 'stats_total')} {total:.2f}{currency}\n"
-        f"{t(lang, 'stats_operations')} {len(expenses)}\n"
-        f"{t(lang, 'stats_avg_expense')} {avg:.2f}{currency}\n\n"
-        f"{render_category_stats(expenses, currency, lang)}\n\n"
-        f"{render_daily_dynamics(expenses, currency, lang)}"
+        f"{t(lang, 'stats_total')} {format_amount(stats.total)}{currency}\n"
+        f"{t(lang, 'stats_operations')} {stats.count}\n"
+        f"{t(lang, 'stats_avg_expense')} {format_amount(avg)}{currency}\n\n"
+        f"{render_category_stats(stats.by_category, currency, lang)}\n\n"
+        f"{render_daily_dynamics(stats.by_day, currency, lang)}"
     )
 
     await callback.message.edit_text(
@@ -186,3 +207,40 @@ async def stats_period(callback: types.CallbackQuery):
     )
 
     await callback.answer()
+
+
+@router.message(StatsStates.waiting_for_range)
+async def stats_range(message: types.Message, state: FSMContext, user_settings: SettingsSnapshot):
+    lang = user_settings.language
+    currency = user_settings.currency
+
+    date_range = parse_date_range(message.text or "")
+    if date_range is None:
+        return await message.answer(t(lang, "stats_range_invalid"), reply_markup=back_kb(lang))
+
+    await state.clear()
+    start, end = date_range
+    end_exclusive = end + datetime.timedelta(days=1)
+    days = (end_exclusive - start).days
+
+    # Totals and the comparison with the previous range of the same length
+    # come from the prefix sums; only the per-category split needs a query
+    index = await period_index_cache.get(message.from_user.id)
+    current = index.range(start, end_exclusive)
+    previous = index.range(start - datetime.timedelta(days=days), start)
+
+    if not current.count:
+        return await message.answer(t(lang, "no_data_period"), reply_markup=back_kb(lang))
+
+    stats = await get_rollup_stats(message.from_user.id, start, end_exclusive)
+
+    text = (
+        f"{t(lang, 'stats_period_label')} `{start} — {end}`\n"
+        f"{t(lang, 'stats_total')} {format_amount(current.total)}{currency}\n"
+        f"{t(lang, 'stats_operations')} {current.count}\n"
+        f"{t(lang, 'stats_avg_expense')} {format_amount(round(current.total / current.count))}{currency}\n"
+        f"{t(lang, 'stats_prev_range', total=format_amount(previous.total), change=change_label(current.total, previous.total), currency=currency)}\n\n"
+        f"{render_category_stats(stats.by_category, currency, lang)}"
+    )
+
+    await message.answer(text, parse_mode="Markdown", reply_markup=back_kb(lang))
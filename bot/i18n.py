@@ -1,3 +1,9 @@
+import json
+import logging
+from pathlib import Path
+from string import Formatter
+from typing import Callable, Optional, Union
+
 translations = {
     "ru": {
         "add_category": "➕ Добавить категорию",
@@ -13,7 +19,15 @@ translations = {
         "language_changed": "Язык изменен",
         "choose_currency": "💱 Выберите валюту:",
         "your_categories": "📂 <b>Ваши категории</b>\nНажмите на категорию, чтобы удалить.",
-        "limit_coming_soon": "⚠️ Лимит расходов скоро будет реализован 👍",
+        "limit_current": "⚠️ Месячный лимит: {limit}{currency}",
+        "limit_not_set": "⚠️ Месячный лимит не установлен",
+        "enter_limit": "Введите новый месячный лимит (0 — убрать лимит):",
+        "limit_set": "✅ Месячный лимит: {limit}{currency}",
+        "limit_removed": "✅ Лимит убран",
+        "limit_warning": "⚠️ Использовано {percent}% месячного лимита: {total} из {limit}{currency}",
+        "limit_exceeded": "🚨 Месячный лимит превышен: {total} из {limit}{currency}",
+        "digest_daily": "🗓 *Итоги дня*: {total}{currency} ({count} расх.)",
+        "digest_weekly": "🗓 *Итоги недели*: {total}{currency} ({count} расх.)",
         "clear_expenses_confirm": "❗ Удалить ВСЕ расходы?\nЭто действие необратимо!",
         "delete_all": "🔥 Удалить всё",
         "choose_language": "🌐 Выберите язык:",
@@ -53,6 +67,15 @@ translations = {
         "stats_operations": "🧾 *Операций:*",
         "stats_avg_expense": "➗ *Средний расход:*",
         "no_data": "Нет данных.",
+        "stats_30d": "📆 30 дней",
+        "stats_90d": "📆 90 дней",
+        "stats_mom": "↔️ Месяц к месяцу",
+        "stats_range": "🗓 Свой период",
+        "stats_rolling": "📅 *Последние {days} дн.:* {total}{currency} ({count} расх.)\n➗ *В день:* {per_day}{currency}\n↕️ *Предыдущие {days} дн.:* {prev_total}{currency} ({change})",
+        "stats_mom_text": "📅 *Этот месяц:* {total}{currency} ({count} расх.)\n↕️ *Те же дни прошлого месяца:* {prev_total}{currency} ({change})\n🗓 *Весь прошлый месяц:* {last_month}{currency}",
+        "stats_enter_range": "Введите период: две даты, например 2024-01-01 2024-03-31 или 01.01.2024 31.03.2024",
+        "stats_range_invalid": "Не удалось разобрать даты. Пример: 2024-01-01 2024-03-31",
+        "stats_prev_range": "↕️ *Предыдущий такой же период:* {total}{currency} ({change})",
         "history_title": "Нажмите на расход для редактирования\nПоследние расходы:",
         "no_expenses": "У тебя пока нет записанных расходов.",
         "edit_amount": "✏️ Изменить сумму",
@@ -67,6 +90,25 @@ translations = {
         "deleted": "Удалено!",
         "expense_deleted": "🗑 Запись удалена.",
         "expense_not_found_alert": "Запись не найдена",
+        "history_older": "⬅️ Раньше",
+        "history_newer": "Позже ➡️",
+        "category_not_found": "Категория не найдена",
+        "bulk_prompt": "Отправьте расходы одним сообщением, по одному на строку:\n\nЕда 12.5\nТранспорт 3\n\nКатегории: {categories}",
+        "bulk_added": "🟢 *Добавлено расходов: {count}*\nНа сумму: *{total}*",
+        "bulk_skipped": "Пропущены строки: {lines}",
+        "bulk_nothing_parsed": "Не удалось разобрать ни одной строки. Формат: `Категория сумма`",
+        "bulk_too_many": "Слишком много строк, максимум {limit}",
+        "export_usage": "Использование: /export или /export json",
+        "export_done": "📤 Экспортировано расходов: {count}",
+        "import_prompt": "Отправьте CSV-файл с колонками date, category, amount (как в /export).\n\nКатегории: {categories}",
+        "import_send_file": "Отправьте CSV-файл документом.",
+        "import_too_large": "Файл слишком большой, максимум {limit} МБ.",
+        "import_started": "📥 Импорт начат…",
+        "import_progress": "📥 Импортировано: {count}…",
+        "import_done": "✅ Импорт завершён, добавлено расходов: {count}",
+        "import_skipped": "Пропущено строк: {count} (например: {lines})",
+        "import_bad_format": "Не удалось прочитать файл. Нужен CSV в UTF-8 с заголовком category, amount.",
+        "import_failed": "❌ Импорт не удался, ничего не добавлено. Попробуйте позже.",
 
     },
     "en": {
@@ -83,7 +125,15 @@ translations = {
         "language_changed": "Language changed",
         "choose_currency": "💱 Choose currency:",
         "your_categories": "📂 <b>Your categories</b>\nTap a category to delete it.",
-        "limit_coming_soon": "⚠️ Spending limit will be implemented soon 👍",
+        "limit_current": "⚠️ Monthly limit: {limit}{currency}",
+        "limit_not_set": "⚠️ No monthly limit set",
+        "enter_limit": "Enter a new monthly limit (0 removes the limit):",
+        "limit_set": "✅ Monthly limit: {limit}{currency}",
+        "limit_removed": "✅ Limit removed",
+        "limit_warning": "⚠️ {percent}% of the monthly limit used: {total} of {limit}{currency}",
+        "limit_exceeded": "🚨 Monthly limit exceeded: {total} of {limit}{currency}",
+        "digest_daily": "🗓 *Today*: {total}{currency} ({count} expenses)",
+        "digest_weekly": "🗓 *This week*: {total}{currency} ({count} expenses)",
         "clear_expenses_confirm": "❗ Delete ALL expenses?\nThis action is irreversible!",
         "delete_all": "🔥 Delete all",
         "choose_language": "🌐 Choose language:",
@@ -123,6 +173,15 @@ translations = {
         "stats_operations": "🧾 *Operations:*",
         "stats_avg_expense": "➗ *Average expense:*",
         "no_data": "No data.",
+        "stats_30d": "📆 30 days",
+        "stats_90d": "📆 90 days",
+        "stats_mom": "↔️ Month vs month",
+        "stats_range": "🗓 Custom range",
+        "stats_rolling": "📅 *Last {days} days:* {total}{currency} ({count} expenses)\n➗ *Per day:* {per_day}{currency}\n↕️ *Previous {days} days:* {prev_total}{currency} ({change})",
+        "stats_mom_text": "📅 *This month:* {total}{currency} ({count} expenses)\n↕️ *Same days last month:* {prev_total}{currency} ({change})\n🗓 *All of last month:* {last_month}{currency}",
+        "stats_enter_range": "Enter a period: two dates, e.g. 2024-01-01 2024-03-31 or 01.01.2024 31.03.2024",
+        "stats_range_invalid": "Couldn't read the dates. Example: 2024-01-01 2024-03-31",
+        "stats_prev_range": "↕️ *Previous period of the same length:* {total}{currency} ({change})",
         "history_title": "Tap on an expense for edit\nRecent expenses:",
         "no_expenses": "You don't have any recorded expenses yet.",
         "edit_amount": "✏️ Edit amount",
@@ -137,13 +196,171 @@ translations = {
         "deleted": "Deleted!",
         "expense_deleted": "🗑 Record deleted.",
         "expense_not_found_alert": "Record not found",
+        "history_older": "⬅️ Older",
+        "history_newer": "Newer ➡️",
+        "category_not_found": "Category not found",
+        "bulk_prompt": "Send expenses in one message, one per line:\n\nFood 12.5\nTransport 3\n\nCategories: {categories}",
+        "bulk_added": "🟢 *Expenses added: {count}*\nTotal: *{total}*",
+        "bulk_skipped": "Skipped lines: {lines}",
+        "bulk_nothing_parsed": "Couldn't parse any line. Format: `Category amount`",
+        "bulk_too_many": "Too many lines, {limit} max",
+        "export_usage": "Usage: /export or /export json",
+        "export_done": "📤 Expenses exported: {count}",
+        "import_prompt": "Send a CSV file with date, category, amount columns (same as /export).\n\nCategories: {categories}",
+        "import_send_file": "Send the CSV file as a document.",
+        "import_too_large": "The file is too large, {limit} MB max.",
+        "import_started": "📥 Import started…",
+        "import_progress": "📥 Imported: {count}…",
+        "import_done": "✅ Import finished, expenses added: {count}",
+        "import_skipped": "Skipped lines: {count} (e.g. {lines})",
+        "import_bad_format": "Couldn't read the file. A UTF-8 CSV with a category, amount header is expected.",
+        "import_failed": "❌ Import failed, nothing was added. Please try again later.",
 
     }
 }
 
 
 
-def t(lang: str, key: str, **kwargs):
-    """Simple translation helper."""
-    text = translations.get(lang, translations["ru"]).get(key, key)
-    return text.format(**kwargs)
+# ======================================================
+#        Compiled catalog
+# ======================================================
+
+logger = logging.getLogger(__name__)
+
+LOCALES_DIR = Path(__file__).parent / "locales"
+
+
+class Template:
+    """A translation with placeholders, parsed once."""
+
+    __slots__ = ("text", "fields")
+
+    def __init__(self, text: str, fields: frozenset):
+        self.text = text
+        self.fields = fields
+
+    def render(self, kwargs: dict) -> str:
+        return self.text.format_map(kwargs)
+
+
+def placeholders(text: str) -> frozenset:
+    """Top-level names used in a str.format template ("{amount:.2f}" → amount)."""
+    names = set()
+    for _, field, _, _ in Formatter().parse(text):
+        if field is not None:
+            names.add(field.split(".")[0].split("[")[0])
+    return frozenset(names)
+
+
+def compile_template(text: str) -> Union[str, Template]:
+    """Static strings are stored already rendered, only real templates get a Template."""
+    fields = placeholders(text)
+    if not fields:
+        return text.format()
+    return Template(text, fields)
+
+
+class Catalog:
+    """
+    Translations compiled per language on first use.
+
+    Languages come from `sources` (the dict above) or from
+    <locales_dir>/<lang>.json. Every language is checked against `base`:
+    a key whose placeholders differ fails loading instead of blowing up
+    later in a handler. Unknown languages and keys fall back to `default`.
+    """
+
+    def __init__(self, sources: dict, default: str = "ru", base: str = "en",
+                 locales_dir: Optional[Path] = LOCALES_DIR):
+        self.sources = sources
+        self.default = default
+        self.base = base
+        self.locales_dir = locales_dir
+        self._compiled: dict[str, dict[str, Union[str, Template]]] = {}
+        self._missing: set = set()
+        self._listeners: list[Callable[[str, dict], None]] = []
+
+        self._base_fields = {key: placeholders(text) for key, text in sources[base].items()}
+        for lang in sources:
+            self._load(lang)
+
+    def _validate(self, lang: str, texts: dict):
+        for key, text in texts.items():
+            expected = self._base_fields.get(key)
+            if expected is not None and placeholders(text) != expected:
+                raise ValueError(
+                    f"i18n: '{lang}.{key}' uses {sorted(placeholders(text))}, "
+                    f"'{self.base}.{key}' uses {sorted(expected)}"
+                )
+
+    def _read_file(self, lang: str) -> Optional[dict]:
+        if self.locales_dir is None or not lang.isalnum():
+            return None
+        path = self.locales_dir / f"{lang}.json"
+        if not path.is_file():
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _load(self, lang: str) -> Optional[dict]:
+        texts = self.sources.get(lang)
+        if texts is None:
+            try:
+                texts = self._read_file(lang)
+            except (OSError, ValueError):
+                logger.exception("i18n: can't read language '%s'", lang)
+                texts = None
+        if texts is None:
+            return None
+
+        self._validate(lang, texts)
+        table = {key: compile_template(text) for key, text in texts.items()}
+        self._compiled[lang] = table
+        for listener in self._listeners:
+            listener(lang, table)
+        return table
+
+    def _warn_once(self, what: tuple):
+        if what not in self._missing:
+            self._missing.add(what)
+            logger.warning("i18n: missing %s, using '%s'", ":".join(what), self.default)
+
+    def table(self, lang: str) -> dict:
+        table = self._compiled.get(lang)
+        if table is not None:
+            return table
+
+        # Same key _warn_once stores, so a missing language is looked up once
+        if (lang,) not in self._missing:
+            try:
+                table = self._load(lang)
+            except ValueError:
+                logger.exception("i18n: language '%s' is broken", lang)
+            if table is not None:
+                return table
+            self._warn_once((lang,))
+
+        return self._compiled[self.default]
+
+    def on_load(self, listener: Callable[[str, dict], None]):
+        """listener(lang, table) for every loaded language, now and later."""
+        self._listeners.append(listener)
+        for lang, table in self._compiled.items():
+            listener(lang, table)
+
+    def t(self, lang: str, key: str, **kwargs) -> str:
+        """Simple translation helper."""
+        entry = self.table(lang).get(key)
+        if entry is None:
+            entry = self._compiled[self.default].get(key)
+            if entry is None:
+                return key
+            self._warn_once((lang, key))
+
+        if entry.__class__ is str:
+            return entry
+        return entry.render(kwargs)
+
+
+catalog = Catalog(translations)
+t = catalog.t
@@ -0,0 +1,10 @@
+from functools import lru_cache
+
+
+def cached_keyboard(maxsize: int = 32):
+    """
+    lru_cache for keyboard builders. The returned markup is shared by every
+    user with the same arguments, and aiogram's pydantic models are not
+    frozen: a cached markup must never be modified in place.
+    """
+    return lru_cache(maxsize=maxsize)
@@ -1,6 +1,9 @@
+
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 from bot.i18n import t 
+from bot.keyboard_cache import cached_keyboard
 
+@cached_keyboard()
 def main_menu(lang: str):
     return ReplyKeyboardMarkup(
         keyboard=[
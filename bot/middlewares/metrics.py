@@ -0,0 +1,59 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from bot.services.metrics import (
+    UpdateScope, current_update,
+    update_latency, sessions_per_update, queries_per_update,
+    handler_latency, handler_errors,
+)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """
+    Outer middleware on dp.update, registered first: times the whole update
+    and counts the DB sessions/queries it caused (user context loading included).
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        scope = UpdateScope()
+        token = current_update.set(scope)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            update_latency.observe(time.perf_counter() - started)
+            sessions_per_update.observe(scope.sessions)
+            queries_per_update.observe(scope.queries)
+            current_update.reset(token)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Inner middleware (dp.message / dp.callback_query): runs only once a
+    handler is chosen, so `data["handler"]` tells which one. Inner
+    middlewares of the dispatcher apply to all included routers.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        name = data["handler"].callback.__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            handler_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            handler_latency.observe(time.perf_counter() - started, name)
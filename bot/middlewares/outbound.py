@@ -0,0 +1,141 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+
+
+class TokenBucket:
+    """`rate` tokens per second, up to `capacity` saved for bursts. Waiters are served FIFO."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def block(self, seconds: float):
+        """Flood control from Telegram: nothing goes out for `seconds`."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+        # Refill from the end of the pause, not from the last send
+        self.updated = self.blocked_until
+
+
+class OutboundRateLimiter(BaseRequestMiddleware):
+    """
+    Session middleware every Bot API call goes through (bot.session.middleware).
+
+    Calls addressed to a chat (they carry `chat_id`: sendMessage,
+    editMessageText, sendDocument...) wait for a token from that chat's
+    bucket and then from the global one. Everything else (getUpdates,
+    answerCallbackQuery, setWebhook...) is passed straight through.
+    On TelegramRetryAfter the chat is paused for the requested time and
+    the call is retried, up to `max_retries` times.
+    """
+
+    def __init__(self, global_rate: float, global_burst: float,
+                 chat_rate: float, chat_burst: float,
+                 max_retries: int = 3, max_chats: int = 10_000):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._global = TokenBucket(global_rate, global_burst)
+        self._chats: OrderedDict[int | str, TokenBucket] = OrderedDict()
+
+        # Metrics
+        self.waiting = 0
+        self.max_waiting = 0
+        self.sent = 0
+        self.retries = 0
+        self.failed = 0
+        self.wait_time = 0.0
+        self.send_time = 0.0
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            # Forgotten buckets are refilled ones anyway
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def _acquire(self, bucket: TokenBucket):
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        started = time.monotonic()
+        try:
+            await bucket.acquire()
+            await self._global.acquire()
+        finally:
+            self.waiting -= 1
+            self.wait_time += time.monotonic() - started
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        bucket = self._chat_bucket(chat_id)
+        attempt = 0
+        while True:
+            await self._acquire(bucket)
+            started = time.monotonic()
+            try:
+                result = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    self.failed += 1
+                    raise
+                attempt += 1
+                self.retries += 1
+                bucket.block(e.retry_after)
+                continue
+            finally:
+                self.send_time += time.monotonic() - started
+
+            self.sent += 1
+            return result
+
+    def stats(self) -> dict:
+        done = self.sent or 1
+        return {
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "sent": self.sent,
+            "retries": self.retries,
+            "failed": self.failed,
+            "avg_wait": self.wait_time / done,
+            "avg_send": self.send_time / done,
+            "chats": len(self._chats),
+        }
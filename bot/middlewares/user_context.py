@@ -0,0 +1,69 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User as TgUser
+from sqlalchemy import select, and_
+
+from db.models import async_session, User, UserSettings, Category
+from bot.handlers.settings import default_user_settings, default_categories, load_settings_snapshot
+from bot.services.settings_cache import settings_cache, SettingsSnapshot
+
+
+async def load_user_context(tg_user: TgUser) -> SettingsSnapshot:
+    """User + settings + categories in one joined query, creating missing rows on the way."""
+    cached = settings_cache.get(tg_user.id)
+    if cached:
+        return cached
+
+    async with async_session() as session:
+        result = await session.execute(
+            select(User, UserSettings, Category)
+            .outerjoin(UserSettings, UserSettings.user_id == User.telegram_id)
+            .outerjoin(Category, and_(Category.user_id == User.telegram_id, Category.is_active.is_(True)))
+            .where(User.telegram_id == tg_user.id)
+            .order_by(Category.position, Category.id)
+        )
+        rows = result.all()
+        user, settings = (rows[0][0], rows[0][1]) if rows else (None, None)
+        categories = [c for _, _, c in rows if c is not None]
+
+        if user is not None and settings is not None:
+            return settings_cache.put(SettingsSnapshot.from_model(settings, categories))
+
+        # First contact: the only path that needs more than one query
+        if user is None:
+            session.add(User(
+                telegram_id=tg_user.id,
+                username=tg_user.username,
+                firstname=tg_user.first_name or "",
+                lastname=tg_user.last_name or "",
+                is_active=True
+            ))
+            # Older versions could create settings without a user row
+            snapshot = await load_settings_snapshot(session, tg_user.id)
+            if snapshot is not None:
+                await session.commit()
+                return settings_cache.put(snapshot)
+
+        settings = default_user_settings(tg_user.id)
+        categories = default_categories(tg_user.id)
+        session.add(settings)
+        session.add_all(categories)
+        await session.commit()
+
+    return settings_cache.put(SettingsSnapshot.from_model(settings, categories))
+
+
+class UserContextMiddleware(BaseMiddleware):
+    """Puts the sender's settings snapshot into handler kwargs as `user_settings`."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        tg_user = data.get("event_from_user")
+        if tg_user is not None:
+            data["user_settings"] = await load_user_context(tg_user)
+        return await handler(event, data)
@@ -0,0 +1,153 @@
+"""
+Daily/weekly spending digests for users with notifications on.
+
+Users are walked in keyset batches of DIGEST_BATCH_SIZE by user_id; each
+batch costs two queries (settings + one grouped rollup query for all of
+its users) no matter how many users it holds. Messages go out through
+DigestSender with bounded concurrency; pacing is up to the bot session's
+OutboundRateLimiter.
+"""
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+from sqlalchemy import select
+
+from core.config import settings as config
+from db.models import async_session, UserSettings
+from bot.i18n import t
+from bot.services.stats_service import get_batch_rollup_stats
+from bot.services.money import format_amount
+from bot.services.stats_format import render_category_stats
+
+logger = logging.getLogger(__name__)
+
+
+class DigestSender:
+    """
+    Sends messages with at most `concurrency` in flight. Rate limits and
+    flood-control retries are handled by the bot session (OutboundRateLimiter).
+    """
+
+    def __init__(self, bot: Bot, concurrency: int):
+        self.bot = bot
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(self, chat_id: int, text: str) -> bool:
+        async with self._semaphore:
+            try:
+                await self.bot.send_message(chat_id, text, parse_mode="Markdown")
+                return True
+            except TelegramAPIError as e:
+                # Blocked the bot / chat is gone / still flooded after retries /
+                # network or server error: only this chat misses the digest
+                logger.info("Digest to %s not sent: %s", chat_id, e.message)
+                return False
+
+    async def send_all(self, messages: list[tuple[int, str]]) -> int:
+        results = await asyncio.gather(
+            *(self.send(chat_id, text) for chat_id, text in messages),
+            return_exceptions=True,
+        )
+        # Anything else is a bug, but it shouldn't cost the rest of the round
+        for (chat_id, _), result in zip(messages, results):
+            if isinstance(result, Exception):
+                logger.error("Digest to %s failed", chat_id, exc_info=result)
+        return sum(result is True for result in results)
+
+
+def digest_kind(day: date) -> Optional[str]:
+    if config.DIGEST_WEEKLY and day.weekday() == config.DIGEST_WEEKDAY:
+        return "weekly"
+    if config.DIGEST_DAILY:
+        return "daily"
+    return None
+
+
+def digest_period(kind: str, day: date) -> tuple[date, date]:
+    """[start, end) in days, ending with `day` itself."""
+    end = day + timedelta(days=1)
+    return (end - timedelta(days=7) if kind == "weekly" else day), end
+
+
+def render_digest(kind: str, stats, currency: str, lang: str) -> str:
+    return (
+        f"{t(lang, 'digest_' + kind, total=format_amount(stats.total), currency=currency, count=stats.count)}\n\n"
+        f"{render_category_stats(stats.by_category, currency, lang)}"
+    )
+
+
+async def send_digests(bot: Bot, kind: str, day: date,
+                       batch_size: int = None, sender: DigestSender = None) -> int:
+    """Sends one digest round, returns the number of delivered messages."""
+    batch_size = batch_size or config.DIGEST_BATCH_SIZE
+    sender = sender or DigestSender(bot, config.DIGEST_CONCURRENCY)
+    start, end = digest_period(kind, day)
+
+    sent, last_id = 0, None
+    while True:
+        query = (
+            select(UserSettings.user_id, UserSettings.currency, UserSettings.language)
+            .where(UserSettings.notifications.is_(True))
+            .order_by(UserSettings.user_id)
+            .limit(batch_size)
+        )
+        if last_id is not None:
+            query = query.where(UserSettings.user_id > last_id)
+
+        async with async_session() as session:
+            users = (await session.execute(query)).all()
+        if not users:
+            break
+        last_id = users[-1].user_id
+
+        stats = await get_batch_rollup_stats([u.user_id for u in users], start, end)
+        messages = [
+            (u.user_id, render_digest(kind, stats[u.user_id], u.currency, u.language))
+            for u in users
+            if u.user_id in stats  # nothing spent → no digest
+        ]
+        sent += await sender.send_all(messages)
+
+        if len(users) < batch_size:
+            break
+
+    return sent
+
+
+def seconds_until(hour: int, now: datetime) -> float:
+    run_at = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return (run_at - now).total_seconds()
+
+
+class DigestScheduler:
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        async def loop():
+            while True:
+                await asyncio.sleep(seconds_until(config.DIGEST_HOUR, datetime.now()))
+                today = datetime.now().date()
+                kind = digest_kind(today)
+                if kind is None:
+                    continue
+                try:
+                    sent = await send_digests(self.bot, kind, today)
+                    logger.info("Digest (%s): sent %s messages", kind, sent)
+                except Exception:
+                    logger.exception("Digest (%s) failed", kind)
+
+        if self._task is None:
+            self._task = asyncio.create_task(loop())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,39 @@
+"""
+Read-only expense rows for history, details and export.
+
+Only the four columns the handlers show are selected, into plain
+NamedTuples: no ORM instances, no identity map, no lazy relationships.
+Writes still go through the Expense model.
+"""
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from sqlalchemy import select, Select
+
+from db.models import async_session, Expense, Category
+
+
+class ExpenseRow(NamedTuple):
+    id: int
+    category: str
+    amount: int  # minor units
+    created_at: Optional[datetime]
+
+
+def expense_rows_query(user_id: int) -> Select:
+    return (
+        select(Expense.id, Category.name.label("category"), Expense.amount, Expense.created_at)
+        .join(Category, Category.id == Expense.category_id)
+        .where(Expense.user_id == user_id)
+    )
+
+
+async def fetch_expense_rows(query: Select) -> list[ExpenseRow]:
+    async with async_session() as session:
+        result = await session.execute(query)
+        return [ExpenseRow(*row) for row in result]
+
+
+async def get_expense_row(user_id: int, expense_id: int) -> Optional[ExpenseRow]:
+    rows = await fetch_expense_rows(expense_rows_query(user_id).where(Expense.id == expense_id))
+    return rows[0] if rows else None
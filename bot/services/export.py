@@ -0,0 +1,103 @@
+"""
+Streaming export of a user's expenses (/export).
+
+Rows come from a server-side cursor in chunks of EXPORT_CHUNK_SIZE and are
+written to a temp file with aiofiles as they arrive, so neither the result
+set nor the file contents are ever held in memory at once.
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+from typing import AsyncIterator
+
+import aiofiles
+from core.config import settings as config
+from db.models import async_session, Expense
+from bot.services.expense_rows import expense_rows_query
+from bot.services.money import format_amount
+
+EXPORT_FORMATS = ("csv", "json")
+CSV_HEADER = ("id", "date", "category", "amount")
+
+
+async def stream_expense_rows(user_id: int, chunk_size: int = None) -> AsyncIterator[list]:
+    """Yields lists of (id, category, amount, created_at) rows, oldest first."""
+    chunk_size = chunk_size or config.EXPORT_CHUNK_SIZE
+    stmt = (
+        expense_rows_query(user_id)
+        .order_by(Expense.id)
+        .execution_options(yield_per=chunk_size)
+    )
+
+    async with async_session() as session:
+        result = await session.stream(stmt)
+        async for partition in result.partitions():
+            yield partition
+
+
+def _isoformat(value, sep: str = "T") -> str:
+    # created_at is nullable in old rows
+    return value.isoformat(sep=sep, timespec="seconds") if value else ""
+
+
+def _csv_chunk(rows, header: bool = False) -> str:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if header:
+        writer.writerow(CSV_HEADER)
+    writer.writerows(
+        (row.id, _isoformat(row.created_at, " "), row.category, format_amount(row.amount))
+        for row in rows
+    )
+    return buf.getvalue()
+
+
+def _json_chunk(rows, first: bool) -> str:
+    items = (
+        json.dumps({
+            "id": row.id,
+            "date": _isoformat(row.created_at),
+            "category": row.category,
+            "amount": format_amount(row.amount),
+        }, ensure_ascii=False)
+        for row in rows
+    )
+    body = ",\n".join(items)
+    return body if first else ",\n" + body
+
+
+async def export_expenses(user_id: int, fmt: str = "csv") -> tuple[str, int]:
+    """
+    Writes the user's expenses to a temp file.
+    Returns (path, row count); the caller removes the file.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    fd, path = tempfile.mkstemp(prefix=f"spender_{user_id}_", suffix=f".{fmt}")
+    os.close(fd)
+
+    count = 0
+    try:
+        async with aiofiles.open(path, "w", encoding="utf-8", newline="") as f:
+            if fmt == "json":
+                await f.write("[\n")
+            else:
+                await f.write(_csv_chunk((), header=True))
+
+            async for rows in stream_expense_rows(user_id):
+                if fmt == "json":
+                    await f.write(_json_chunk(rows, first=count == 0))
+                else:
+                    await f.write(_csv_chunk(rows))
+                count += len(rows)
+
+            if fmt == "json":
+                await f.write("\n]\n")
+    except BaseException:
+        os.remove(path)
+        raise
+
+    return path, count
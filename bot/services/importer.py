@@ -0,0 +1,169 @@
+"""
+Streaming CSV import of expenses (/import).
+
+The file is read line by line with aiofiles into one csv.reader and parsed
+in batches of IMPORT_BATCH_SIZE records. Each batch goes to the DB as one executemany
+INSERT; the rollup deltas are summed in memory and applied once per
+(day, category) bucket. Everything runs in a single transaction, so a
+failed import leaves nothing behind.
+
+Expected columns (header required, same as /export): date, category, amount.
+`id` is ignored, `date` is optional and defaults to the import time.
+"""
+import csv
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Optional
+
+import aiofiles
+from sqlalchemy import insert
+
+from core.config import settings as config
+from bot.services.rollup import apply_expense_delta
+from bot.services.money import parse_amount
+from db.models import async_session, Expense
+
+# Only the first few bad lines are reported back to the user
+MAX_REPORTED_ERRORS = 10
+
+
+class ImportFormatError(ValueError):
+    """The file has no usable header or is not valid CSV."""
+
+
+@dataclass
+class ImportResult:
+    imported: int = 0
+    skipped: int = 0
+    bad_lines: list[int] = field(default_factory=list)
+
+
+def _parse_row(row: dict, categories: dict, now: datetime):
+    """Returns (category_id, amount, created_at) or None for a bad row."""
+    category = categories.get((row.get("category") or "").strip().casefold())
+    if category is None:
+        return None
+
+    amount = parse_amount(row.get("amount") or "")
+    if not amount:
+        return None
+
+    created_at = now
+    raw_date = (row.get("date") or "").strip()
+    if raw_date:
+        try:
+            created_at = datetime.fromisoformat(raw_date)
+        except ValueError:
+            return None
+        # The column is naive local time: "2024-01-01T10:00+03:00" is converted
+        if created_at.tzinfo is not None:
+            created_at = created_at.astimezone().replace(tzinfo=None)
+
+    return category.id, amount, created_at
+
+
+class _LineFeed:
+    """Line source of one csv.reader for the whole file, topped up between reads.
+
+    Lines are only handed to the reader once the records they belong to are
+    complete, so a quoted field spanning several lines is never cut in two.
+    """
+
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+async def import_expenses(user_id: int, path: str, categories: tuple,
+                          on_progress: Optional[Callable[[ImportResult], None]] = None,
+                          batch_size: int = None) -> ImportResult:
+    """on_progress(result) is called after every batch; it must not block, the transaction is open."""
+    batch_size = batch_size or config.IMPORT_BATCH_SIZE
+    by_name = {cat.name.casefold(): cat for cat in categories}
+    now = datetime.now()
+
+    result = ImportResult()
+    totals = defaultdict(lambda: [0, 0])  # (day, category_id) → [total, count]
+
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+
+    def take(count: Optional[int]):
+        """Next `count` records (all that are left if None) with their first line number."""
+        records = []
+        while count is None or len(records) < count:
+            first_line = reader.line_num + 1
+            values = next(reader, None)
+            if values is None:
+                break
+            records.append((first_line, values))
+        return records
+
+    async with async_session() as session, \
+            aiofiles.open(path, "r", encoding="utf-8-sig", newline="") as f:
+
+        async def flush(records: list):
+            rows = []
+            for line_no, values in records:
+                if not values:
+                    continue  # blank line
+                parsed = _parse_row(dict(zip(header, values)), by_name, now)
+                if parsed is None:
+                    result.skipped += 1
+                    if len(result.bad_lines) < MAX_REPORTED_ERRORS:
+                        result.bad_lines.append(line_no)
+                    continue
+
+                category_id, amount, created_at = parsed
+                rows.append({"user_id": user_id, "category_id": category_id,
+                             "amount": amount, "created_at": created_at})
+                bucket = totals[(created_at.date(), category_id)]
+                bucket[0] += amount
+                bucket[1] += 1
+
+            if rows:
+                # list of params → executemany
+                await session.execute(insert(Expense), rows)
+                result.imported += len(rows)
+            if on_progress is not None:
+                on_progress(result)
+
+        try:
+            feed.lines.append(await f.readline())
+            header = next(reader, None)
+            header = [col.strip().lower() for col in header or ()]
+            if "category" not in header or "amount" not in header:
+                raise ImportFormatError(header)
+
+            # A newline ends a record only outside quotes, i.e. after an even
+            # number of quote chars ("" escapes count twice, keeping the parity)
+            quotes = complete = 0
+            async for line in f:
+                feed.lines.append(line)
+                quotes += line.count('"')
+                if quotes % 2:
+                    continue
+                quotes = 0
+                complete += 1
+                if complete >= batch_size:
+                    await flush(take(complete))
+                    complete = 0
+            # The rest, including an unterminated quoted field at the end
+            await flush(take(None))
+        except csv.Error as e:
+            raise ImportFormatError(str(e)) from e
+
+        for (day, category_id), (total, count) in totals.items():
+            await apply_expense_delta(session, user_id, day, category_id, total, count)
+
+        await session.commit()
+
+    return result
@@ -0,0 +1,139 @@
+"""
+Monthly spending limit: running totals per user.
+
+The current month's total is loaded once from the daily rollup and then
+kept up to date in memory: every expense write adds its amount, so the
+limit check costs O(1) per insert instead of re-summing the month.
+Writes that touch many rows at once (clear, import) just drop the entry
+and the next check reloads it.
+"""
+import asyncio
+import time
+from weakref import WeakValueDictionary
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import select, func
+
+from core.config import settings as config
+from core.ttl_cache import TTLCache
+from db.models import async_session, DailyTotal
+from bot.services.money import sql_sum
+
+# Share of the limit at which a warning is sent, in ascending order
+LIMIT_THRESHOLDS = (0.8, 1.0)
+
+
+def _month_key(day: date) -> tuple[int, int]:
+    return day.year, day.month
+
+
+def _month_bounds(day: date) -> tuple[date, date]:
+    start = day.replace(day=1)
+    if start.month == 12:
+        return start, start.replace(year=start.year + 1, month=1)
+    return start, start.replace(month=start.month + 1)
+
+
+async def load_month_total(user_id: int, day: date) -> int:
+    start, end = _month_bounds(day)
+    async with async_session() as session:
+        total = await session.scalar(
+            select(func.coalesce(sql_sum(DailyTotal.total), 0))
+            .where(DailyTotal.user_id == user_id, DailyTotal.day >= start, DailyTotal.day < end)
+        )
+    return total
+
+
+class MonthlyTotals:
+    """
+    Bounded LRU of (month, total) per user with a TTL.
+
+    The TTL bounds drift when several bot processes write for the same user.
+    Every entry remembers when its total was loaded: a total loaded after an
+    expense's transaction started may already include it, so it is reloaded
+    instead of incremented. Loads run under a per-user lock, so an older
+    snapshot can't overwrite a newer one.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 600.0):
+        # user_id → (month, total, loaded_at)
+        self._data: TTLCache[int, tuple[tuple[int, int], int, float]] = TTLCache(maxsize, ttl)
+        self._locks: WeakValueDictionary[int, asyncio.Lock] = WeakValueDictionary()
+
+    def _get(self, user_id: int, month: tuple[int, int]) -> Optional[tuple[int, float]]:
+        entry = self._data.get(user_id)
+        if entry is None:
+            return None
+
+        cached_month, total, loaded_at = entry
+        if cached_month != month:
+            self._data.pop(user_id)
+            return None
+        return total, loaded_at
+
+    def _put(self, user_id: int, month: tuple[int, int], total: int, loaded_at: float):
+        self._data.put(user_id, (month, total, loaded_at))
+
+    def _lock(self, user_id: int) -> asyncio.Lock:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        return lock
+
+    async def add(self, user_id: int, amount: int, when: datetime, since: float) -> tuple[int, int]:
+        """
+        Registers an already committed expense.
+        `since` is time.monotonic() taken before its transaction committed.
+        Returns the month total (before, after) it.
+        """
+        month = _month_key(when)
+        if month != _month_key(datetime.now()):
+            return 0, 0
+
+        async with self._lock(user_id):
+            cached = self._get(user_id, month)
+            if cached is None or cached[1] >= since:
+                # Missing, or loaded while this expense was being written:
+                # a fresh load surely includes it
+                after = await load_month_total(user_id, when)
+                self._put(user_id, month, after, time.monotonic())
+                return after - amount, after
+
+            total, loaded_at = cached
+            self._put(user_id, month, total + amount, loaded_at)
+            return total, total + amount
+
+    def adjust(self, user_id: int, delta: int, when: Optional[datetime]):
+        """Edited/deleted expense: shifts the cached total if it is for that month."""
+        month = _month_key(datetime.now())
+        if when is None or _month_key(when) != month:
+            return
+        cached = self._get(user_id, month)
+        if cached is not None:
+            total, loaded_at = cached
+            self._put(user_id, month, total + delta, loaded_at)
+
+    def invalidate(self, user_id: int):
+        self._data.pop(user_id)
+
+    def clear(self):
+        self._data.clear()
+
+
+def crossed_threshold(limit: Optional[int], before: int, after: int) -> Optional[float]:
+    """The highest threshold passed by going from `before` to `after`, if any."""
+    if not limit or limit <= 0:
+        return None
+
+    crossed = None
+    for share in LIMIT_THRESHOLDS:
+        if before < limit * share <= after:
+            crossed = share
+    return crossed
+
+
+monthly_totals = MonthlyTotals(
+    maxsize=config.LIMIT_CACHE_SIZE,
+    ttl=config.LIMIT_CACHE_TTL,
+)
@@ -0,0 +1,205 @@
+"""
+In-process metrics in the Prometheus text format, served on /metrics.
+
+Handler latency/errors are recorded by bot/middlewares/metrics.py, query
+timings by the engine hooks below. DB work is also counted per update:
+UpdateMetricsMiddleware opens a scope in a contextvar and the hooks add
+to it (SQLAlchemy runs the sync part in a greenlet that shares the
+task's context).
+"""
+import re
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from aiohttp import web
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, total in self._values.items():
+            lines.append(f"{self.name}{_labels(self.labels, values)} {total}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        # label values → [per-bucket counts (+Inf last), sum, count]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values):
+        entry = self._values.get(label_values)
+        if entry is None:
+            entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                cumulative += n
+                labels = _labels(self.labels + ("le",), values + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.labels, values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        # prefix → callable returning {name: number}, read on every scrape
+        self._sources: dict[str, Callable[[], dict]] = {}
+
+    def counter(self, *args, **kwargs) -> Counter:
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def add_source(self, prefix: str, stats: Callable[[], dict]):
+        """Exposes an existing stats() dict as gauges named <prefix>_<key>."""
+        self._sources[prefix] = stats
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for prefix, stats in self._sources.items():
+            for key, value in stats().items():
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+handler_latency = registry.histogram(
+    "spender_handler_seconds", "Handler execution time", labels=("handler",))
+handler_errors = registry.counter(
+    "spender_handler_errors_total", "Exceptions raised by handlers", labels=("handler", "error"))
+update_latency = registry.histogram(
+    "spender_update_seconds", "Whole update processing time, middlewares included")
+query_latency = registry.histogram(
+    "spender_db_query_seconds", "SQL statement execution time", labels=("statement",))
+sessions_per_update = registry.histogram(
+    "spender_db_sessions_per_update", "DB connections checked out while handling one update",
+    buckets=COUNT_BUCKETS)
+queries_per_update = registry.histogram(
+    "spender_db_queries_per_update", "SQL statements executed while handling one update",
+    buckets=COUNT_BUCKETS)
+
+
+# ============ PER-UPDATE SCOPE ============
+
+class UpdateScope:
+    __slots__ = ("sessions", "queries")
+
+    def __init__(self):
+        self.sessions = 0
+        self.queries = 0
+
+
+current_update: ContextVar[Optional[UpdateScope]] = ContextVar("current_update", default=None)
+
+
+# ============ DB HOOKS ============
+
+# Expanded IN (...) lists and VALUES rows of different lengths are one shape
+_PARAM_RUN = re.compile(r"\?(?:\s*,\s*\?)+|%\(\w+\)s(?:\s*,\s*%\(\w+\)s)+|\$\d+(?:\s*,\s*\$\d+)+")
+_VALUES_RUN = re.compile(r"(\(\?\.\.\.\))(?:\s*,\s*\(\?\.\.\.\))+")
+_SPACES = re.compile(r"\s+")
+MAX_STATEMENT_LABEL = 160
+
+
+def statement_shape(statement: str) -> str:
+    shape = _SPACES.sub(" ", statement).strip()
+    shape = _PARAM_RUN.sub("?...", shape)
+    shape = _VALUES_RUN.sub(r"\1", shape)
+    return shape[:MAX_STATEMENT_LABEL]
+
+
+# The start time lives on the statement's execution context: a statement
+# that raises never reaches after_cursor_execute, and the context goes away
+# with it instead of piling up on the pooled connection
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = context._query_start
+    query_latency.observe(time.perf_counter() - started, statement_shape(statement))
+    scope = current_update.get()
+    if scope is not None:
+        scope.queries += 1
+
+
+def _checkout(dbapi_connection, connection_record, connection_proxy):
+    scope = current_update.get()
+    if scope is not None:
+        scope.sessions += 1
+
+
+ENGINE_HOOKS = {
+    "before_cursor_execute": _before_cursor_execute,
+    "after_cursor_execute": _after_cursor_execute,
+    "checkout": _checkout,
+}
+
+
+def instrument_engine(engine: AsyncEngine):
+    """Adds the timing hooks to the engine; calling it again is a no-op."""
+    sync_engine = engine.sync_engine
+    for name, hook in ENGINE_HOOKS.items():
+        if not event.contains(sync_engine, name, hook):
+            event.listen(sync_engine, name, hook)
+
+
+# ============ HTTP ============
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(host: str, port: int, path: str) -> web.AppRunner:
+    """/metrics on a listener of its own, never on the public webhook app."""
+    app = web.Application()
+    app.router.add_get(path, metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
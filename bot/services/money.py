@@ -0,0 +1,54 @@
+"""
+Money is stored and summed as integer minor units (cents, kopecks...),
+so SUM() in SQL and totals in Python are exact. These helpers convert
+at the edges: user input → cents, cents → text.
+"""
+from typing import Optional
+
+from sqlalchemy import BigInteger, cast, func
+
+MINOR_UNITS = 100
+MAX_DECIMALS = 2
+# Largest accepted amount: far below the 64-bit column limit even summed
+# over millions of expenses
+MAX_AMOUNT = 1_000_000_000 * MINOR_UNITS
+
+# Thousands separators people type: "1 234,50", "1'234.50", no-break spaces
+_GROUPING = str.maketrans("", "", " '\u00a0\u202f")
+
+
+def parse_amount(text: str) -> Optional[int]:
+    """
+    "12" / "12.5" / "12,50" / "1 234,5" → cents. Both `.` and `,` are a
+    decimal separator; None for anything else (negative, 3+ decimals,
+    above MAX_AMOUNT...).
+    """
+    text = text.strip().translate(_GROUPING).replace(",", ".")
+    units, _, fraction = text.partition(".")
+
+    # The length check keeps int() away from huge digit strings
+    if not (units or fraction) or len(fraction) > MAX_DECIMALS \
+            or len(units.lstrip("0")) > len(str(MAX_AMOUNT // MINOR_UNITS)):
+        return None
+    # isdecimal() alone lets through non-ASCII digits
+    for part in (units, fraction):
+        if part and not (part.isascii() and part.isdecimal()):
+            return None
+
+    amount = int(units or 0) * MINOR_UNITS + int(fraction.ljust(MAX_DECIMALS, "0"))
+    return amount if amount <= MAX_AMOUNT else None
+
+
+def format_amount(cents: int) -> str:
+    """1250 → "12.50"."""
+    sign = "-" if cents < 0 else ""
+    units, rest = divmod(abs(int(cents)), MINOR_UNITS)
+    return f"{sign}{units}.{rest:02d}"
+
+
+def sql_sum(column):
+    """
+    SUM() of a money column as an integer. Postgres returns NUMERIC for
+    SUM(BIGINT), which would come back as Decimal without the cast.
+    """
+    return cast(func.sum(column), BigInteger)
@@ -0,0 +1,127 @@
+"""
+Per-user prefix sums over the daily rollup for arbitrary date ranges.
+
+The user's daily totals are loaded once (one row per day with spending)
+and turned into cumulative sums, so the total/count of any range, such as
+rolling 30/90-day windows, month over month or a custom range, is two
+binary searches and a subtraction. Indexes are kept in an LRU with a TTL
+(PERIOD_INDEX_CACHE_TTL, 0 disables it) and dropped after any commit in
+this process that changed the user's rollup rows.
+"""
+from bisect import bisect_left
+from datetime import date, timedelta
+from typing import NamedTuple, Optional
+
+from sqlalchemy import event, select, func
+from sqlalchemy.orm import Session
+
+from core.config import settings as config
+from core.ttl_cache import TTLCache
+from db.models import async_session, DailyTotal
+from bot.services.money import sql_sum
+from bot.services.rollup import TOUCHED_USERS
+
+
+class RangeTotals(NamedTuple):
+    total: int  # minor units
+    count: int
+
+
+class PeriodIndex:
+    __slots__ = ("days", "totals", "counts")
+
+    def __init__(self, rows):
+        """rows: (day, total, count) ordered by day."""
+        self.days = []
+        self.totals = [0]
+        self.counts = [0]
+        for day, total, count in rows:
+            self.days.append(day.toordinal())
+            self.totals.append(self.totals[-1] + total)
+            self.counts.append(self.counts[-1] + count)
+
+    def range(self, start: date, end: date) -> RangeTotals:
+        """Totals for days in [start, end)."""
+        i = bisect_left(self.days, start.toordinal())
+        j = bisect_left(self.days, end.toordinal())
+        if j <= i:
+            return RangeTotals(0, 0)
+        return RangeTotals(self.totals[j] - self.totals[i], self.counts[j] - self.counts[i])
+
+
+def rolling_window(index: PeriodIndex, days: int, today: date) -> tuple[RangeTotals, RangeTotals]:
+    """Last `days` days including today, and the `days` before them."""
+    end = today + timedelta(days=1)
+    start = end - timedelta(days=days)
+    return index.range(start, end), index.range(start - timedelta(days=days), start)
+
+
+def month_over_month(index: PeriodIndex, today: date) -> tuple[RangeTotals, RangeTotals, RangeTotals]:
+    """This month so far, the same days of last month, and all of last month."""
+    month_start = today.replace(day=1)
+    prev_start = (month_start - timedelta(days=1)).replace(day=1)
+    # Same day number, capped by the length of last month (31st → 28th/30th)
+    prev_same_end = min(prev_start + timedelta(days=today.day), month_start)
+    return (
+        index.range(month_start, today + timedelta(days=1)),
+        index.range(prev_start, prev_same_end),
+        index.range(prev_start, month_start),
+    )
+
+
+async def load_period_index(user_id: int) -> PeriodIndex:
+    async with async_session() as session:
+        rows = await session.execute(
+            select(DailyTotal.day, sql_sum(DailyTotal.total), func.sum(DailyTotal.count))
+            .where(DailyTotal.user_id == user_id)
+            .group_by(DailyTotal.day)
+            .order_by(DailyTotal.day)
+        )
+        return PeriodIndex(rows)
+
+
+class PeriodIndexCache:
+    """Bounded LRU of PeriodIndex per user with a TTL."""
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 600.0):
+        self._data: TTLCache[int, PeriodIndex] = TTLCache(maxsize, ttl)
+        # Bumped by every invalidation: an index loaded while a write was
+        # committing may already be stale, so it is returned but not kept
+        self._epoch = 0
+
+    async def get(self, user_id: int) -> PeriodIndex:
+        index = self._data.get(user_id)
+        if index is not None:
+            return index
+
+        epoch = self._epoch
+        index = await load_period_index(user_id)
+        if epoch == self._epoch:
+            self._data.put(user_id, index)
+        return index
+
+    def invalidate(self, user_id: Optional[int]):
+        self._epoch += 1
+        if user_id is None:
+            self._data.clear()
+        else:
+            self._data.pop(user_id)
+
+
+period_index_cache = PeriodIndexCache(
+    maxsize=config.PERIOD_INDEX_CACHE_SIZE,
+    ttl=config.PERIOD_INDEX_CACHE_TTL,
+)
+
+
+# Expense writes go through the rollup, which marks the users in session.info;
+# drop their indexes only once the new rows are visible to other sessions
+@event.listens_for(Session, "after_commit")
+def _invalidate_touched(session: Session):
+    for user_id in session.info.pop(TOUCHED_USERS, ()):
+        period_index_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_touched(session: Session):
+    session.info.pop(TOUCHED_USERS, None)
@@ -0,0 +1,105 @@
+"""
+Daily totals rollup (spenderbot_daily_totals).
+
+Every write to spenderbot_expenses applies the same delta to the rollup
+inside the same session/transaction, so month and year stats can read at
+most one row per (day, category) instead of scanning raw expenses.
+"""
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import select, delete, func, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import async_session, DailyTotal, Expense
+
+
+# session.info key: users whose rollup rows this session changed (None = all).
+# Caches built on the rollup (bot/services/period_index.py) drop them after commit.
+TOUCHED_USERS = "rollup_touched_users"
+
+
+def _upsert(dialect_name: str):
+    return postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+
+
+def _touch(session: AsyncSession, user_id: Optional[int]):
+    session.info.setdefault(TOUCHED_USERS, set()).add(user_id)
+
+
+async def apply_expense_delta(session: AsyncSession, user_id: int, day: date,
+                              category_id: int, amount: int, count: int):
+    """Adds amount (minor units)/count to the (user, day, category) bucket. Caller commits."""
+    upsert = _upsert(session.bind.dialect.name)
+    stmt = upsert(DailyTotal).values(
+        user_id=user_id, day=day, category_id=category_id, total=amount, count=count
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailyTotal.user_id, DailyTotal.day, DailyTotal.category_id],
+        set_={
+            "total": DailyTotal.total + stmt.excluded.total,
+            "count": DailyTotal.count + stmt.excluded.count,
+        },
+    )
+    await session.execute(stmt)
+    _touch(session, user_id)
+
+    if count < 0:
+        # The last expense of the bucket is gone
+        await session.execute(
+            delete(DailyTotal).where(
+                DailyTotal.user_id == user_id,
+                DailyTotal.day == day,
+                DailyTotal.category_id == category_id,
+                DailyTotal.count <= 0,
+            )
+        )
+
+
+async def record_expense(session: AsyncSession, expense: Expense, sign: int = 1):
+    """sign=1 for a new expense, sign=-1 for a deleted one."""
+    if expense.created_at is None:
+        return
+    await apply_expense_delta(
+        session, expense.user_id, expense.created_at.date(),
+        expense.category_id, sign * expense.amount, sign,
+    )
+
+
+async def clear_user_totals(session: AsyncSession, user_id: int):
+    await session.execute(delete(DailyTotal).where(DailyTotal.user_id == user_id))
+    _touch(session, user_id)
+
+
+async def backfill_daily_totals(user_id: Optional[int] = None):
+    """Rebuilds the rollup from spenderbot_expenses (all users or one)."""
+    day = func.date(Expense.created_at)
+    source = (
+        select(Expense.user_id, day, Expense.category_id, func.sum(Expense.amount), func.count(Expense.id))
+        .where(Expense.created_at.is_not(None))
+        .group_by(Expense.user_id, day, Expense.category_id)
+    )
+    wipe = delete(DailyTotal)
+
+    if user_id is not None:
+        source = source.where(Expense.user_id == user_id)
+        wipe = wipe.where(DailyTotal.user_id == user_id)
+
+    async with async_session() as session:
+        await session.execute(wipe)
+        await session.execute(
+            insert(DailyTotal).from_select(
+                ["user_id", "day", "category_id", "total", "count"], source
+            )
+        )
+        _touch(session, user_id)
+        await session.commit()
+
+
+# For manual start: python -m bot.services.rollup [user_id]
+if __name__ == "__main__":
+    import asyncio
+    import sys
+
+    asyncio.run(backfill_daily_totals(int(sys.argv[1]) if len(sys.argv) > 1 else None))
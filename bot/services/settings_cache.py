@@ -0,0 +1,79 @@
+from dataclasses import dataclass
+from typing import Iterable, NamedTuple, Optional
+
+from core.config import settings as config
+from core.ttl_cache import TTLCache
+from db.models import UserSettings, Category
+
+
+class CategoryRef(NamedTuple):
+    id: int
+    name: str
+
+
+@dataclass(frozen=True, slots=True)
+class SettingsSnapshot:
+    """Read-only copy of a UserSettings row, safe to share between handlers."""
+
+    user_id: int
+    currency: str
+    categories: tuple[CategoryRef, ...]  # active ones, in display order
+    limit: Optional[int]  # minor units
+    notifications: bool
+    language: str
+
+    @property
+    def category_list(self) -> list[str]:
+        return [c.name for c in self.categories]
+
+    def category_name(self, category_id: int) -> Optional[str]:
+        for c in self.categories:
+            if c.id == category_id:
+                return c.name
+        return None
+
+    @classmethod
+    def from_model(cls, settings: UserSettings, categories: Iterable[Category]) -> "SettingsSnapshot":
+        return cls(
+            user_id=settings.user_id,
+            currency=settings.currency,
+            categories=tuple(CategoryRef(c.id, c.name) for c in categories),
+            limit=settings.limit,
+            notifications=settings.notifications,
+            language=settings.language,
+        )
+
+
+class SettingsCache:
+    """Bounded LRU cache of settings snapshots with a per-entry TTL (0 = no caching)."""
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 300.0):
+        self.hits = 0
+        self.misses = 0
+        self._data: TTLCache[int, SettingsSnapshot] = TTLCache(maxsize, ttl)
+
+    def get(self, user_id: int) -> Optional[SettingsSnapshot]:
+        snapshot = self._data.get(user_id)
+        if snapshot is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return snapshot
+
+    def put(self, snapshot: SettingsSnapshot) -> SettingsSnapshot:
+        return self._data.put(snapshot.user_id, snapshot)
+
+    def invalidate(self, user_id: int):
+        self._data.pop(user_id)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+settings_cache = SettingsCache(
+    maxsize=config.SETTINGS_CACHE_SIZE,
+    ttl=config.SETTINGS_CACHE_TTL,
+)
@@ -0,0 +1,52 @@
+"""
+Text rendering of stats shared by the stats screens and the digests.
+"""
+from bot.i18n import t
+from bot.services.money import format_amount
+
+
+# ======================================================
+#                 GRAPH (ASCII)
+# ======================================================
+
+def bar_chart(value, max_value, length=15):
+    if max_value == 0:
+        return ""
+    filled = int((value / max_value) * length)
+    return "█" * filled + "░" * (length - filled)
+
+
+# ======================================================
+#        Display stats by categories
+# ======================================================
+
+def render_category_stats(categories: dict, currency, lang: str):
+    if not categories:
+        return t(lang, "no_data")
+
+    max_value = max(categories.values())
+    lines = [t(lang, "stats_by_categories"), ""]
+
+    for name, value in categories.items():
+        bar = bar_chart(value, max_value)
+        lines.append(f"{name}: `{bar}` — *{format_amount(value)}{currency}*")
+
+    return "\n".join(lines)
+
+
+# ======================================================
+#        Dynamic of the expenses by dates
+# ======================================================
+
+def render_daily_dynamics(days: dict, currency, lang: str):
+    if not days:
+        return t(lang, "no_data")
+
+    max_value = max(days.values())
+    lines = [t(lang, "stats_dynamics"), ""]
+
+    for date, value in sorted(days.items()):
+        bar = bar_chart(value, max_value)
+        lines.append(f"{date}: `{bar}` {format_amount(value)}{currency}")
+
+    return "\n".join(lines)
@@ -1,29 +1,160 @@
+from dataclasses import dataclass, field
 from sqlalchemy import select, func
-from db.models import async_session, Expense
-from datetime import datetime, timedelta
+from db.models import async_session, Expense, DailyTotal, Category
+from bot.services.money import sql_sum
+from datetime import date, datetime, timedelta
+from typing import Optional
 
 
-async def get_stats(user_id: int, start_date: datetime, end_date: datetime):
-    """Basic function for getting the statistic"""
+@dataclass
+class PeriodStats:
+    """Aggregated numbers for one stats screen, money in minor units."""
+    total: int = 0
+    count: int = 0
+    by_category: dict[str, int] = field(default_factory=dict)
+    by_day: dict[date, int] = field(default_factory=dict)
+
+
+def _period_filter(user_id: int, start_date: datetime, end_date: Optional[datetime]):
+    conditions = [Expense.user_id == user_id, Expense.created_at >= start_date]
+    if end_date is not None:
+        conditions.append(Expense.created_at < end_date)
+    return conditions
+
+
+def _as_date(value) -> date:
+    # SQLite returns DATE() as a string, Postgres as a date
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def period_start(period: str, now: datetime) -> datetime:
+    if period == "day":
+        return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    if period == "week":
+        monday = now - timedelta(days=now.weekday())
+        return monday.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    if period == "month":
+        return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    if period == "year":
+        return now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    return now - timedelta(days=7)
+
+
+async def get_stats(user_id: int, start_date: datetime, end_date: Optional[datetime] = None):
+    """Basic function for getting the statistic: (category, total, count) rows"""
 
     async with async_session() as session:
         query = (
             select(
-                Expense.category,
-                func.sum(Expense.amount).label("total")
-            )
-            .where(
-                Expense.user_id == user_id,
-                Expense.date >= start_date,
-                Expense.date < end_date,
+                Category.name.label("category"),
+                sql_sum(Expense.amount).label("total"),
+                func.count(Expense.id).label("count"),
             )
-            .group_by(Expense.category)
+            .join(Category, Category.id == Expense.category_id)
+            .where(*_period_filter(user_id, start_date, end_date))
+            .group_by(Category.id, Category.name)
+            .order_by(func.sum(Expense.amount).desc())
         )
 
         rows = await session.execute(query)
         return rows.all()
 
 
+async def get_period_stats(user_id: int, start_date: datetime, end_date: Optional[datetime] = None) -> PeriodStats:
+    """Totals by category and by day, computed by the database."""
+    conditions = _period_filter(user_id, start_date, end_date)
+    day = func.date(Expense.created_at)
+
+    async with async_session() as session:
+        by_category = await session.execute(
+            select(Category.name, sql_sum(Expense.amount), func.count(Expense.id))
+            .join(Category, Category.id == Expense.category_id)
+            .where(*conditions)
+            .group_by(Category.id, Category.name)
+            .order_by(func.sum(Expense.amount).desc())
+        )
+        by_day = await session.execute(
+            select(day, sql_sum(Expense.amount))
+            .where(*conditions)
+            .group_by(day)
+            .order_by(day)
+        )
+
+        stats = PeriodStats()
+        for category, total, count in by_category:
+            stats.by_category[category] = total
+            stats.total += total
+            stats.count += count
+
+        for d, total in by_day:
+            stats.by_day[_as_date(d)] = total
+
+    return stats
+
+
+async def get_rollup_stats(user_id: int, start_day: date, end_day: Optional[date] = None) -> PeriodStats:
+    """Same as get_period_stats, but read from the daily totals rollup (whole days only)."""
+    conditions = [DailyTotal.user_id == user_id, DailyTotal.day >= start_day]
+    if end_day is not None:
+        conditions.append(DailyTotal.day < end_day)
+
+    async with async_session() as session:
+        by_category = await session.execute(
+            select(Category.name, sql_sum(DailyTotal.total), func.sum(DailyTotal.count))
+            .join(Category, Category.id == DailyTotal.category_id)
+            .where(*conditions)
+            .group_by(Category.id, Category.name)
+            .order_by(func.sum(DailyTotal.total).desc())
+        )
+        by_day = await session.execute(
+            select(DailyTotal.day, sql_sum(DailyTotal.total))
+            .where(*conditions)
+            .group_by(DailyTotal.day)
+            .order_by(DailyTotal.day)
+        )
+
+        stats = PeriodStats()
+        for category, total, count in by_category:
+            stats.by_category[category] = total
+            stats.total += total
+            stats.count += count
+
+        for d, total in by_day:
+            stats.by_day[d] = total
+
+    return stats
+
+
+async def get_batch_rollup_stats(user_ids: list[int], start_day: date,
+                                 end_day: Optional[date] = None) -> dict[int, PeriodStats]:
+    """Totals by category for many users in one grouped rollup query (digests)."""
+    conditions = [DailyTotal.user_id.in_(user_ids), DailyTotal.day >= start_day]
+    if end_day is not None:
+        conditions.append(DailyTotal.day < end_day)
+
+    async with async_session() as session:
+        rows = await session.execute(
+            select(DailyTotal.user_id, Category.name, sql_sum(DailyTotal.total), func.sum(DailyTotal.count))
+            .join(Category, Category.id == DailyTotal.category_id)
+            .where(*conditions)
+            .group_by(DailyTotal.user_id, Category.id, Category.name)
+            .order_by(DailyTotal.user_id, func.sum(DailyTotal.total).desc())
+        )
+
+        result: dict[int, PeriodStats] = {}
+        for user_id, category, total, count in rows:
+            stats = result.setdefault(user_id, PeriodStats())
+            stats.by_category[category] = total
+            stats.total += total
+            stats.count += count
+
+    return result
+
+
 async def get_today_stats(user_id: int):
     today = datetime.now().date()
     return await get_stats(
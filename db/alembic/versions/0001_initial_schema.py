@@ -0,0 +1,60 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'spenderbot_users',
+        sa.Column('telegram_id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=50), nullable=True),
+        sa.Column('firstname', sa.String(length=50), nullable=False),
+        sa.Column('lastname', sa.String(length=50), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('registred_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('telegram_id'),
+    )
+    op.create_table(
+        'spenderbot_settings',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('currency', sa.String(length=10), nullable=True),
+        sa.Column('categories', sa.String(length=300), nullable=True),
+        sa.Column('limit', sa.Float(), nullable=True),
+        sa.Column('notifications', sa.Boolean(), nullable=True),
+        sa.Column('language', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['spenderbot_users.telegram_id']),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    op.create_table(
+        'spenderbot_expenses',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('category', sa.String(length=50), nullable=False),
+        sa.Column('amount', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['spenderbot_users.telegram_id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('spenderbot_expenses')
+    op.drop_table('spenderbot_settings')
+    op.drop_table('spenderbot_users')
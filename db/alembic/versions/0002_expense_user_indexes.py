@@ -0,0 +1,37 @@
+"""composite indexes on spenderbot_expenses
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 12:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_spenderbot_expenses_user_id_created_at',
+        'spenderbot_expenses',
+        ['user_id', 'created_at'],
+    )
+    op.create_index(
+        'ix_spenderbot_expenses_user_id_id',
+        'spenderbot_expenses',
+        ['user_id', 'id'],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_spenderbot_expenses_user_id_id', table_name='spenderbot_expenses')
+    op.drop_index('ix_spenderbot_expenses_user_id_created_at', table_name='spenderbot_expenses')
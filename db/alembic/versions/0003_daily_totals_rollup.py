@@ -0,0 +1,48 @@
+"""daily totals rollup table
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 12:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'spenderbot_daily_totals',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('category', sa.String(length=50), nullable=False),
+        sa.Column('total', sa.Float(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['spenderbot_users.telegram_id']),
+        sa.PrimaryKeyConstraint('user_id', 'day', 'category'),
+    )
+
+    # Backfill from the existing expenses
+    op.execute(
+        """
+        INSERT INTO spenderbot_daily_totals (user_id, day, category, total, count)
+        SELECT user_id, DATE(created_at), category, SUM(amount), COUNT(id)
+        FROM spenderbot_expenses
+        WHERE created_at IS NOT NULL
+        GROUP BY user_id, DATE(created_at), category
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('spenderbot_daily_totals')
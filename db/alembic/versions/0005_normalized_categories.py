@@ -0,0 +1,177 @@
+"""normalized categories table
+
+Moves categories out of the comma-separated spenderbot_settings.categories
+string into spenderbot_categories and makes expenses and daily totals
+reference them by id.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 12:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+categories_table = sa.table(
+    'spenderbot_categories',
+    sa.column('user_id', sa.Integer),
+    sa.column('name', sa.String),
+    sa.column('position', sa.Integer),
+    sa.column('is_active', sa.Boolean),
+)
+
+
+def _create_daily_totals(category_column: sa.Column) -> None:
+    op.create_table(
+        'spenderbot_daily_totals',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        category_column,
+        sa.Column('total', sa.Float(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['spenderbot_users.telegram_id']),
+        sa.PrimaryKeyConstraint('user_id', 'day', category_column.name),
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'spenderbot_categories',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['spenderbot_users.telegram_id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_spenderbot_categories_user_id_name',
+        'spenderbot_categories',
+        ['user_id', 'name'],
+        unique=True,
+    )
+
+    # Categories from settings (active) and the ones only left on old expenses (deleted)
+    conn = op.get_bind()
+    seen = set()
+    rows = []
+
+    for user_id, names in conn.execute(sa.text("SELECT user_id, categories FROM spenderbot_settings")):
+        position = 0
+        for name in (names or "").split(","):
+            name = name.strip()[:50]
+            if not name or (user_id, name) in seen:
+                continue
+            seen.add((user_id, name))
+            rows.append({"user_id": user_id, "name": name, "position": position, "is_active": True})
+            position += 1
+
+    for user_id, name in conn.execute(sa.text("SELECT DISTINCT user_id, category FROM spenderbot_expenses")):
+        if (user_id, name) not in seen:
+            seen.add((user_id, name))
+            rows.append({"user_id": user_id, "name": name, "position": 0, "is_active": False})
+
+    if rows:
+        op.bulk_insert(categories_table, rows)
+
+    # Expenses: category name → category_id
+    with op.batch_alter_table('spenderbot_expenses') as batch_op:
+        batch_op.add_column(sa.Column('category_id', sa.Integer(), nullable=True))
+
+    op.execute(
+        """
+        UPDATE spenderbot_expenses SET category_id = (
+            SELECT c.id FROM spenderbot_categories c
+            WHERE c.user_id = spenderbot_expenses.user_id
+              AND c.name = spenderbot_expenses.category
+        )
+        """
+    )
+
+    with op.batch_alter_table('spenderbot_expenses') as batch_op:
+        batch_op.alter_column('category_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key(
+            'fk_spenderbot_expenses_category_id', 'spenderbot_categories', ['category_id'], ['id']
+        )
+        batch_op.create_index('ix_spenderbot_expenses_category_id', ['category_id'])
+        batch_op.drop_column('category')
+
+    # Daily totals are derived data: rebuild them keyed by category_id
+    op.drop_table('spenderbot_daily_totals')
+    _create_daily_totals(
+        sa.Column('category_id', sa.Integer(), sa.ForeignKey('spenderbot_categories.id'), nullable=False)
+    )
+    op.execute(
+        """
+        INSERT INTO spenderbot_daily_totals (user_id, day, category_id, total, count)
+        SELECT user_id, DATE(created_at), category_id, SUM(amount), COUNT(id)
+        FROM spenderbot_expenses
+        WHERE created_at IS NOT NULL
+        GROUP BY user_id, DATE(created_at), category_id
+        """
+    )
+
+    with op.batch_alter_table('spenderbot_settings') as batch_op:
+        batch_op.drop_column('categories')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('spenderbot_settings') as batch_op:
+        batch_op.add_column(sa.Column('categories', sa.String(length=300), nullable=True))
+
+    conn = op.get_bind()
+    active = {}
+    for user_id, name in conn.execute(sa.text(
+        "SELECT user_id, name FROM spenderbot_categories WHERE is_active ORDER BY position, id"
+    )):
+        active.setdefault(user_id, []).append(name)
+    for user_id, names in active.items():
+        conn.execute(
+            sa.text("UPDATE spenderbot_settings SET categories = :names WHERE user_id = :user_id"),
+            {"names": ",".join(names)[:300], "user_id": user_id},
+        )
+
+    with op.batch_alter_table('spenderbot_expenses') as batch_op:
+        batch_op.add_column(sa.Column('category', sa.String(length=50), nullable=True))
+
+    op.execute(
+        """
+        UPDATE spenderbot_expenses SET category = (
+            SELECT c.name FROM spenderbot_categories c WHERE c.id = spenderbot_expenses.category_id
+        )
+        """
+    )
+
+    with op.batch_alter_table('spenderbot_expenses') as batch_op:
+        batch_op.alter_column('category', existing_type=sa.String(length=50), nullable=False)
+        batch_op.drop_index('ix_spenderbot_expenses_category_id')
+        batch_op.drop_constraint('fk_spenderbot_expenses_category_id', type_='foreignkey')
+        batch_op.drop_column('category_id')
+
+    op.drop_table('spenderbot_daily_totals')
+    _create_daily_totals(sa.Column('category', sa.String(length=50), nullable=False))
+    op.execute(
+        """
+        INSERT INTO spenderbot_daily_totals (user_id, day, category, total, count)
+        SELECT user_id, DATE(created_at), category, SUM(amount), COUNT(id)
+        FROM spenderbot_expenses
+        WHERE created_at IS NOT NULL
+        GROUP BY user_id, DATE(created_at), category
+        """
+    )
+
+    op.drop_index('ix_spenderbot_categories_user_id_name', table_name='spenderbot_categories')
+    op.drop_table('spenderbot_categories')
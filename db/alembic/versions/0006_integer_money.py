@@ -0,0 +1,66 @@
+"""money as integer minor units
+
+spenderbot_expenses.amount, spenderbot_daily_totals.total and
+spenderbot_settings.limit go from FLOAT to BIGINT cents
+(12.5 → 1250), so sums are exact.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 15:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+MINOR_UNITS = 100
+
+# (table, column, nullable)
+MONEY_COLUMNS = (
+    ('spenderbot_expenses', 'amount', False),
+    ('spenderbot_daily_totals', 'total', False),
+    ('spenderbot_settings', 'limit', True),
+)
+
+
+def _money_column(table_name: str, column_name: str):
+    return sa.table(table_name, sa.column(column_name)).c[column_name]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table_name, column_name, nullable in MONEY_COLUMNS:
+        column = _money_column(table_name, column_name)
+        op.execute(column.table.update().values({column_name: sa.func.round(column * MINOR_UNITS)}))
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.alter_column(
+                column_name,
+                existing_type=sa.Float(),
+                type_=sa.BigInteger(),
+                existing_nullable=nullable,
+                postgresql_using=f'"{column_name}"::bigint',
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table_name, column_name, nullable in MONEY_COLUMNS:
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.alter_column(
+                column_name,
+                existing_type=sa.BigInteger(),
+                type_=sa.Float(),
+                existing_nullable=nullable,
+                postgresql_using=f'"{column_name}"::double precision',
+            )
+        column = _money_column(table_name, column_name)
+        op.execute(column.table.update().values({column_name: column / float(MINOR_UNITS)}))
@@ -0,0 +1,161 @@
+"""
+FSM storage in the bot's own database (spenderbot_fsm), so half-finished
+flows survive restarts and can be shared by several worker processes.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from sqlalchemy import select, delete, or_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from core.ttl_cache import TTLCache
+from db.models import async_session, FSMRecord
+
+logger = logging.getLogger(__name__)
+
+
+class SQLAlchemyStorage(BaseStorage):
+    """
+    One row per key with the state name and JSON data.
+
+    Reads go through a small in-process cache (cache_ttl seconds, 0 disables
+    it). Writes always hit the database and refresh the cache. With several
+    workers a read can be up to cache_ttl stale, keep it low there.
+    Rows untouched for state_ttl seconds are removed in batches by expire_stale().
+    """
+
+    def __init__(
+        self,
+        session_maker=async_session,
+        key_builder: Optional[KeyBuilder] = None,
+        state_ttl: float = 86400,
+        cache_ttl: float = 5.0,
+        cache_size: int = 10_000,
+        expiry_batch: int = 500,
+    ):
+        self.session_maker = session_maker
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+        self.state_ttl = state_ttl
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.expiry_batch = expiry_batch
+        # key → (state, data)
+        self._cache: TTLCache[str, tuple[Optional[str], Dict[str, Any]]] = TTLCache(cache_size, cache_ttl)
+        self._expiry_task: Optional[asyncio.Task] = None
+
+    # ---------------------
+    # DB
+    # ---------------------
+
+    async def _load(self, key: str):
+        cached = self._cache.get(key)
+        if cached:
+            return cached
+
+        async with self.session_maker() as session:
+            row = (await session.execute(
+                select(FSMRecord.state, FSMRecord.data).where(FSMRecord.key == key)
+            )).first()
+
+        state, data = (row.state, json.loads(row.data) if row.data else {}) if row else (None, {})
+        self._cache.put(key, (state, data))
+        return state, data
+
+    async def _upsert(self, key: str, **values):
+        values["updated_at"] = datetime.now()
+
+        async with self.session_maker() as session:
+            insert = postgresql.insert if session.bind.dialect.name == "postgresql" else sqlite.insert
+            stmt = insert(FSMRecord).values(key=key, **values)
+            stmt = stmt.on_conflict_do_update(index_elements=[FSMRecord.key], set_=values)
+            await session.execute(stmt)
+            await session.commit()
+
+    # ---------------------
+    # BaseStorage
+    # ---------------------
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k = self.key_builder.build(key)
+        state = state.state if isinstance(state, State) else state
+        await self._upsert(k, state=state)
+
+        cached = self._cache.get(k)
+        if cached:
+            self._cache.put(k, (state, cached[1]))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(self.key_builder.build(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        k = self.key_builder.build(key)
+        data = dict(data)
+        await self._upsert(k, data=json.dumps(data, ensure_ascii=False))
+
+        cached = self._cache.get(k)
+        if cached:
+            self._cache.put(k, (cached[0], data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(self.key_builder.build(key))
+        return data.copy()
+
+    async def close(self) -> None:
+        if self._expiry_task:
+            self._expiry_task.cancel()
+            self._expiry_task = None
+        self._cache.clear()
+
+    # ---------------------
+    # Expiry
+    # ---------------------
+
+    async def expire_stale(self) -> int:
+        """Deletes stale and cleared rows, expiry_batch keys per statement."""
+        cutoff = datetime.now() - timedelta(seconds=self.state_ttl)
+        stale = or_(
+            FSMRecord.updated_at < cutoff,
+            # what FSMContext.clear() leaves behind
+            (FSMRecord.state.is_(None)) & (or_(FSMRecord.data.is_(None), FSMRecord.data == "{}")),
+        )
+        removed = 0
+
+        while True:
+            async with self.session_maker() as session:
+                keys = (await session.execute(
+                    select(FSMRecord.key).where(stale).limit(self.expiry_batch)
+                )).scalars().all()
+                if not keys:
+                    break
+
+                await session.execute(delete(FSMRecord).where(FSMRecord.key.in_(keys), stale))
+                await session.commit()
+
+            removed += len(keys)
+            for k in keys:
+                self._cache.pop(k)
+
+            if len(keys) < self.expiry_batch:
+                break
+
+        return removed
+
+    def start_expiry(self, interval: float):
+        async def loop():
+            while True:
+                try:
+                    removed = await self.expire_stale()
+                    if removed:
+                        logger.info("FSM storage: expired %s records", removed)
+                except Exception:
+                    logger.exception("FSM storage expiry failed")
+                await asyncio.sleep(interval)
+
+        if self._expiry_task is None:
+            self._expiry_task = asyncio.create_task(loop())
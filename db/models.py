@@ -1,15 +1,16 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Date, DateTime, Boolean, ForeignKey, Index, event
 from sqlalchemy.sql import func
 #from .base import Base
-from sqlalchemy.orm import declarative_base, Mapped, mapped_column
+from sqlalchemy.orm import declarative_base, Mapped, mapped_column, relationship
 from sqlalchemy.ext.asyncio import create_async_engine
-import os
 
 from aiosqlite import *
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 
+from core.config import settings as config
+
 Base = declarative_base()
 
 #Users base
@@ -30,28 +31,100 @@ class UserSettings(Base):
 
     user_id = mapped_column(Integer, ForeignKey("spenderbot_users.telegram_id"), primary_key=True)
     currency = mapped_column(String(10), default="$")
-    categories = mapped_column(String(300), default="Food,Transport,Coffee,Gifts,Other")
-    limit = mapped_column(Float, nullable=True)
+    # Money columns are integer minor units (bot/services/money.py)
+    limit = mapped_column(BigInteger, nullable=True)
     notifications = mapped_column(Boolean, default=True)
     language = Column(String, default="en")
 
 
+#Categories base
+class Category(Base):
+    __tablename__ = "spenderbot_categories"
+    __table_args__ = (
+        Index("ix_spenderbot_categories_user_id_name", "user_id", "name", unique=True),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("spenderbot_users.telegram_id"))
+    name: Mapped[str] = mapped_column(String(50))
+    position: Mapped[int] = mapped_column(Integer, default=0)
+    # Deleted categories stay, old expenses still point to them
+    is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+
 
 #Expenses base
 class Expense(Base):
     __tablename__ = "spenderbot_expenses"
+    __table_args__ = (
+        # stats: WHERE user_id = ? AND created_at >= ?
+        Index("ix_spenderbot_expenses_user_id_created_at", "user_id", "created_at"),
+        # history: WHERE user_id = ? ORDER BY id DESC
+        Index("ix_spenderbot_expenses_user_id_id", "user_id", "id"),
+        Index("ix_spenderbot_expenses_category_id", "category_id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("spenderbot_users.telegram_id"))
-    category: Mapped[str] = mapped_column(String(50))
-    amount: Mapped[float] = mapped_column(Float)
+    category_id: Mapped[int] = mapped_column(Integer, ForeignKey("spenderbot_categories.id"))
+    amount: Mapped[int] = mapped_column(BigInteger)  # minor units
     created_at = mapped_column(DateTime, default=datetime.now)
 
+    category: Mapped[Category] = relationship(lazy="joined")
+
+
+#Daily totals (rollup of expenses, maintained by bot/services/rollup.py)
+class DailyTotal(Base):
+    __tablename__ = "spenderbot_daily_totals"
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("spenderbot_users.telegram_id"), primary_key=True)
+    day = mapped_column(Date, primary_key=True)
+    category_id: Mapped[int] = mapped_column(Integer, ForeignKey("spenderbot_categories.id"), primary_key=True)
+    total: Mapped[int] = mapped_column(BigInteger, default=0)  # minor units
+    count: Mapped[int] = mapped_column(Integer, default=0)
+
+
+#FSM states and data (db/fsm_storage.py)
+class FSMRecord(Base):
+    __tablename__ = "spenderbot_fsm"
+
+    key: Mapped[str] = mapped_column(String(200), primary_key=True)
+    state = mapped_column(String(100), nullable=True)
+    data = mapped_column(Text, nullable=True)  # JSON
+    updated_at = mapped_column(DateTime, default=datetime.now, index=True)
+
+
+
+def _engine_options(url: str) -> dict:
+    options = {
+        "echo": config.DB_ECHO,
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+    }
+    # In-memory SQLite runs on a single static connection, no pool to size
+    if ":memory:" not in url:
+        options.update(
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            pool_recycle=config.DB_POOL_RECYCLE,
+        )
+    return options
+
+
+engine = create_async_engine(config.SPENDER_DB_URL, **_engine_options(config.SPENDER_DB_URL))
+
 
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers work while one chat writes; busy_timeout makes
+        # concurrent writers wait for the lock instead of failing at once
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+        cursor.close()
 
-engine = create_async_engine(
-    os.getenv("SPENDER_DB_URL", "sqlite+aiosqlite:///spender.db"),
-    echo=True)
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 async def init_db():
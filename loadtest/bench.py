@@ -0,0 +1,206 @@
+"""
+Micro-benchmarks for the stats path: fetching, aggregating and rendering.
+
+    python -m loadtest.bench                      # compare with baselines.json
+    python -m loadtest.bench --sizes 1000,1000000 --save
+
+For every dataset size (expenses of one user, spread over the last year)
+the same year of stats is computed three ways:
+
+    orm     load Expense objects and aggregate in Python
+    sql     GROUP BY over spenderbot_expenses (get_period_stats)
+    rollup  GROUP BY over spenderbot_daily_totals (get_rollup_stats)
+
+and the result is rendered (render_category_stats / render_daily_dynamics).
+Each case reports the median of --repeat runs. --save stores them as the
+new baselines; otherwise they are compared with the stored ones and
+--check makes a slowdown beyond --tolerance exit with status 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+BASELINES = os.path.join(os.path.dirname(__file__), "baselines.json")
+CATEGORIES = ("Food", "Transport", "Coffee", "Gifts", "Other")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,100000", help="expenses per user, comma separated")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baselines", default=BASELINES)
+    parser.add_argument("--save", action="store_true", help="store the results as baselines")
+    parser.add_argument("--check", action="store_true", help="exit 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="allowed slowdown factor")
+    return parser.parse_args(argv)
+
+
+# ============ DATASET ============
+
+async def generate(user_id: int, size: int, rng: random.Random):
+    from sqlalchemy import insert
+    from db.models import async_session, User, Category, Expense
+    from bot.services.rollup import backfill_daily_totals
+
+    now = datetime.now()
+    async with async_session() as session:
+        session.add(User(telegram_id=user_id, firstname=f"Bench{size}"))
+        categories = [Category(user_id=user_id, name=name, position=i) for i, name in enumerate(CATEGORIES)]
+        session.add_all(categories)
+        await session.flush()
+        ids = [c.id for c in categories]
+
+        batch = []
+        for _ in range(size):
+            batch.append({
+                "user_id": user_id,
+                "category_id": rng.choice(ids),
+                "amount": rng.randint(100, 30000),
+                "created_at": now - timedelta(minutes=rng.randint(1, 364 * 24 * 60)),
+            })
+            if len(batch) >= 10_000:
+                await session.execute(insert(Expense), batch)
+                batch = []
+        if batch:
+            await session.execute(insert(Expense), batch)
+        await session.commit()
+
+    await backfill_daily_totals(user_id)
+
+
+# ============ CASES ============
+
+async def orm_stats(user_id: int, start: datetime):
+    """What the stats screen used to do: every expense as an object."""
+    from sqlalchemy import select
+    from db.models import async_session, Expense
+    from bot.services.stats_service import PeriodStats
+
+    async with async_session() as session:
+        expenses = (await session.execute(
+            select(Expense).where(Expense.user_id == user_id, Expense.created_at >= start)
+        )).scalars().all()
+
+        stats = PeriodStats()
+        by_category, by_day = defaultdict(int), defaultdict(int)
+        for e in expenses:
+            by_category[e.category.name] += e.amount
+            by_day[e.created_at.date()] += e.amount
+            stats.total += e.amount
+            stats.count += 1
+
+    stats.by_category = dict(sorted(by_category.items(), key=lambda kv: kv[1], reverse=True))
+    stats.by_day = dict(by_day)
+    return stats
+
+
+async def sql_stats(user_id: int, start: datetime):
+    from bot.services.stats_service import get_period_stats
+    return await get_period_stats(user_id, start)
+
+
+async def rollup_stats(user_id: int, start: datetime):
+    from bot.services.stats_service import get_rollup_stats
+    return await get_rollup_stats(user_id, start.date())
+
+
+def render(stats) -> str:
+    from bot.services.stats_format import render_category_stats, render_daily_dynamics
+    return (
+        render_category_stats(stats.by_category, "$", "en")
+        + render_daily_dynamics(stats.by_day, "$", "en")
+    )
+
+
+async def measure(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        if asyncio.iscoroutine(result):
+            await result
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+async def run(args) -> dict:
+    from db.models import init_db, engine
+
+    await init_db()
+    rng = random.Random(1)
+    start = (datetime.now() - timedelta(days=365)).replace(hour=0, minute=0, second=0, microsecond=0)
+    results = {}
+
+    try:
+        for size in map(int, args.sizes.split(",")):
+            user_id = size
+            print(f"generating {size} expenses…", file=sys.stderr)
+            await generate(user_id, size, rng)
+
+            stats = await rollup_stats(user_id, start)
+            cases = {
+                "orm": lambda: orm_stats(user_id, start),
+                "sql": lambda: sql_stats(user_id, start),
+                "rollup": lambda: rollup_stats(user_id, start),
+                "render": lambda: render(stats),
+            }
+            for name, func in cases.items():
+                results[f"{name}/{size}"] = await measure(func, args.repeat)
+    finally:
+        await engine.dispose()
+
+    return results
+
+
+def report(results: dict, baselines: dict, tolerance: float) -> bool:
+    """Prints the table, returns True if something got slower than allowed."""
+    regressed = False
+    print(f"{'case':<18}{'median ms':>12}{'baseline ms':>14}{'ratio':>8}")
+    for name, seconds in results.items():
+        base = baselines.get(name)
+        line = f"{name:<18}{seconds * 1000:>12.3f}"
+        if base:
+            ratio = seconds / base
+            slow = ratio > tolerance
+            regressed |= slow
+            line += f"{base * 1000:>14.3f}{ratio:>8.2f}{'  ← slower' if slow else ''}"
+        print(line)
+    return regressed
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="spender_bench_") as tmp_dir:
+        os.environ["SPENDER_DB_URL"] = f"sqlite+aiosqlite:///{tmp_dir}/bench.db"
+        os.environ.setdefault("BOT_TOKEN", "42:BENCH")
+        os.environ["DB_ECHO"] = "false"
+        results = asyncio.run(run(args))
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f)
+
+    regressed = report(results, baselines, args.tolerance)
+
+    if args.save:
+        baselines.update({name: round(seconds, 6) for name, seconds in results.items()})
+        with open(args.baselines, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    if args.check and regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Stand-in Telegram Bot API: an aiohttp server that accepts every method
+and answers the way Telegram would, closely enough for aiogram to parse.
+The last markup sent to each chat is kept so virtual users can press
+its buttons.
+"""
+import itertools
+import json
+import time
+from collections import Counter
+
+from aiohttp import web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Spender", "username": "spender_bot"}
+
+# Methods that answer with a Message
+MESSAGE_METHODS = {"sendmessage", "editmessagetext", "senddocument", "editmessagereplymarkup"}
+
+
+class FakeBotAPI:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.calls = Counter()
+        self.last_markup: dict[int, dict] = {}
+        self._ids = itertools.count(1)
+        self._runner = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def _params(self, request: web.Request) -> dict:
+        if request.content_type == "application/json":
+            return await request.json()
+        # aiogram sends form data (multipart when there are files)
+        params = {}
+        form = await request.post()
+        for key, value in form.items():
+            params[key] = value if isinstance(value, str) else "<file>"
+        return params
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        params = await self._params(request)
+        self.calls[method] += 1
+
+        if method == "getme":
+            result = BOT_USER
+        elif method in MESSAGE_METHODS:
+            chat_id = int(params.get("chat_id") or 0)
+            markup = params.get("reply_markup")
+            if markup:
+                self.last_markup[chat_id] = json.loads(markup) if isinstance(markup, str) else markup
+            result = {
+                "message_id": int(params.get("message_id") or next(self._ids)),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER,
+                "text": params.get("text") or params.get("caption") or "",
+            }
+        else:
+            result = True
+
+        return web.json_response({"ok": True, "result": result})
+
+    def buttons(self, chat_id: int) -> list[str]:
+        """callback_data of the inline buttons last sent to the chat."""
+        markup = self.last_markup.get(chat_id) or {}
+        return [
+            button["callback_data"]
+            for row in markup.get("inline_keyboard", ())
+            for button in row
+            if "callback_data" in button
+        ]
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # Port 0 → whatever the OS picked
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._runner:
+            await self._runner.cleanup()
@@ -0,0 +1,311 @@
+"""
+Load test: the real dispatcher from main.py against a fake Bot API.
+
+    python -m loadtest.run --users 2000 --concurrency 200 --iterations 5
+
+Each virtual user sends /start and then a random mix of flows (add
+expense, bulk add, stats, history paging), pressing the buttons the bot
+actually sent back. Reports throughput, latency percentiles and DB
+queries/sessions per update for every step.
+
+The DB is a fresh SQLite file in a temp dir unless --db-url is given
+(e.g. an empty Postgres database; tables are created with create_all).
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+FLOWS = ("add", "bulk", "stats", "history")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100, help="virtual users active at once")
+    parser.add_argument("--iterations", type=int, default=5, help="flows per user")
+    parser.add_argument("--mix", default="add=5,bulk=1,stats=2,history=2", help="flow weights")
+    parser.add_argument("--seed-expenses", type=int, default=100, help="past expenses per user before the run")
+    parser.add_argument("--db-url", help="default: SQLite in a temp dir")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args(argv)
+
+
+def configure_env(args, tmp_dir: str):
+    """Must run before anything imports core.config."""
+    os.environ["SPENDER_DB_URL"] = args.db_url or f"sqlite+aiosqlite:///{tmp_dir}/loadtest.db"
+    os.environ.setdefault("BOT_TOKEN", "42:LOADTEST")
+    os.environ.setdefault("DB_ECHO", "false")
+    os.environ.setdefault("DIGEST_ENABLED", "false")
+    os.environ["METRICS_ENABLED"] = "true"
+    # Telegram's per-chat pacing would only measure itself
+    os.environ.setdefault("OUTBOUND_CHAT_RATE", "100000")
+    os.environ.setdefault("OUTBOUND_CHAT_BURST", "100000")
+    os.environ.setdefault("OUTBOUND_GLOBAL_RATE", "100000")
+    os.environ.setdefault("OUTBOUND_GLOBAL_BURST", "100000")
+
+
+# ============ UPDATES ============
+
+_update_ids = itertools.count(1)
+
+
+def _user(uid: int) -> dict:
+    return {"id": uid, "is_bot": False, "first_name": f"Load{uid}", "language_code": "en"}
+
+
+def message_update(uid: int, text: str) -> dict:
+    n = next(_update_ids)
+    return {"update_id": n, "message": {
+        "message_id": n, "date": int(time.time()),
+        "chat": {"id": uid, "type": "private"}, "from": _user(uid), "text": text,
+    }}
+
+
+def callback_update(uid: int, data: str) -> dict:
+    n = next(_update_ids)
+    return {"update_id": n, "callback_query": {
+        "id": str(n), "from": _user(uid), "chat_instance": str(uid), "data": data,
+        "message": {"message_id": n, "date": int(time.time()),
+                    "chat": {"id": uid, "type": "private"}, "text": "..."},
+    }}
+
+
+# ============ RUN ============
+
+class LoadTest:
+    def __init__(self, args, dp, bot, api):
+        from aiogram.types import Update
+
+        self.args = args
+        self.dp = dp
+        self.bot = bot
+        self.api = api
+        self.rng = random.Random(args.seed)
+        self._update_type = Update
+        # step → [(seconds, queries, sessions)]
+        self.samples = defaultdict(list)
+        self.errors = 0
+        self._scopes = {}
+
+        mix = dict(item.split("=") for item in args.mix.split(","))
+        self.flows = [name for name in FLOWS if int(mix.get(name, 0)) > 0]
+        self.weights = [int(mix[name]) for name in self.flows]
+
+    def install_probe(self):
+        """Innermost outer middleware: grabs the per-update DB scope opened by UpdateMetricsMiddleware."""
+        from bot.services.metrics import current_update
+
+        async def probe(handler, event, data):
+            self._scopes[event.update_id] = current_update.get()
+            return await handler(event, data)
+
+        self.dp.update.outer_middleware(probe)
+
+    async def feed(self, step: str, raw: dict):
+        update = self._update_type.model_validate(raw, context={"bot": self.bot})
+        started = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception:
+            self.errors += 1
+        elapsed = time.perf_counter() - started
+
+        scope = self._scopes.pop(update.update_id, None)
+        self.samples[step].append((elapsed, scope.queries if scope else 0, scope.sessions if scope else 0))
+
+    def button(self, uid: int, prefix: str):
+        options = [b for b in self.api.buttons(uid) if b.startswith(prefix)]
+        return self.rng.choice(options) if options else None
+
+    # ---- flows ----
+
+    async def flow_add(self, uid: int):
+        await self.feed("add:/add", message_update(uid, "/add"))
+        category = self.button(uid, "cat:")
+        if category is None:
+            return
+        await self.feed("add:category", callback_update(uid, category))
+        await self.feed("add:amount", message_update(uid, f"{self.rng.randint(1, 500)}.{self.rng.randint(0, 99)}"))
+
+    async def flow_bulk(self, uid: int):
+        from bot.handlers.settings import DEFAULT_CATEGORIES
+
+        lines = "\n".join(
+            f"{self.rng.choice(DEFAULT_CATEGORIES)} {self.rng.randint(1, 100)}" for _ in range(self.rng.randint(2, 10))
+        )
+        await self.feed("bulk:/bulk", message_update(uid, "/bulk"))
+        await self.feed("bulk:lines", message_update(uid, lines))
+
+    async def flow_stats(self, uid: int):
+        await self.feed("stats:/stats", message_update(uid, "/stats"))
+        await self.feed("stats:year", callback_update(uid, "stats:year"))
+        await self.feed("stats:week", callback_update(uid, "stats:week"))
+
+    async def flow_history(self, uid: int):
+        await self.feed("history:/history", message_update(uid, "/history"))
+        for _ in range(2):
+            older = self.button(uid, "hist:older:")
+            if older is None:
+                break
+            await self.feed("history:older", callback_update(uid, older))
+
+    async def virtual_user(self, uid: int):
+        for _ in range(self.args.iterations):
+            flow = self.rng.choices(self.flows, self.weights)[0]
+            await getattr(self, f"flow_{flow}")(uid)
+
+    async def run_users(self, users: list[int], job) -> float:
+        queue = asyncio.Queue()
+        for uid in users:
+            queue.put_nowait(uid)
+
+        async def worker():
+            while not queue.empty():
+                await job(queue.get_nowait())
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+        return time.perf_counter() - started
+
+
+async def seed_expenses(users: list[int], per_user: int, rng: random.Random):
+    """Past year of expenses for every user, straight into the DB, then the rollup."""
+    from sqlalchemy import insert, select
+    from db.models import async_session, Expense, Category
+    from bot.services.rollup import backfill_daily_totals
+
+    if per_user <= 0:
+        return
+
+    now = datetime.now()
+    async with async_session() as session:
+        categories = defaultdict(list)
+        for user_id, category_id in await session.execute(select(Category.user_id, Category.id)):
+            categories[user_id].append(category_id)
+
+        rows = []
+        for uid in users:
+            for _ in range(per_user):
+                rows.append({
+                    "user_id": uid,
+                    "category_id": rng.choice(categories[uid]),
+                    "amount": rng.randint(100, 30000),
+                    "created_at": now - timedelta(minutes=rng.randint(1, 365 * 24 * 60)),
+                })
+                if len(rows) >= 5000:
+                    await session.execute(insert(Expense), rows)
+                    rows = []
+        if rows:
+            await session.execute(insert(Expense), rows)
+        await session.commit()
+
+    await backfill_daily_totals()
+
+
+def percentile(values: list[float], q: float) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def build_report(test: LoadTest, elapsed: float) -> dict:
+    steps = {}
+    all_samples = []
+    for step, samples in sorted(test.samples.items()):
+        if step == "start":
+            continue
+        all_samples.extend(samples)
+        latencies = [s[0] for s in samples]
+        steps[step] = {
+            "updates": len(samples),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "queries_per_update": round(statistics.fmean(s[1] for s in samples), 2),
+            "sessions_per_update": round(statistics.fmean(s[2] for s in samples), 2),
+        }
+
+    latencies = [s[0] for s in all_samples]
+    return {
+        "users": test.args.users,
+        "updates": len(all_samples),
+        "errors": test.errors,
+        "seconds": round(elapsed, 2),
+        "updates_per_second": round(len(all_samples) / elapsed, 1) if elapsed else 0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else 0,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else 0,
+        "queries_per_update": round(statistics.fmean(s[1] for s in all_samples), 2) if all_samples else 0,
+        "api_calls": dict(test.api.calls),
+        "steps": steps,
+    }
+
+
+def print_report(report: dict):
+    print(f"{report['updates']} updates from {report['users']} users in {report['seconds']}s "
+          f"→ {report['updates_per_second']} updates/s, {report['errors']} errors")
+    print(f"latency p50 {report['p50_ms']} ms, p99 {report['p99_ms']} ms, "
+          f"{report['queries_per_update']} queries/update\n")
+    print(f"{'step':<20}{'updates':>9}{'p50 ms':>10}{'p99 ms':>10}{'queries':>9}{'sessions':>10}")
+    for step, row in report["steps"].items():
+        print(f"{step:<20}{row['updates']:>9}{row['p50_ms']:>10}{row['p99_ms']:>10}"
+              f"{row['queries_per_update']:>9}{row['sessions_per_update']:>10}")
+
+
+async def run(args) -> dict:
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    import main
+    from db.models import init_db, engine
+    from loadtest.fake_api import FakeBotAPI
+
+    api = FakeBotAPI()
+    await api.start()
+    await init_db()
+
+    bot = main.create_bot(AiohttpSession(api=TelegramAPIServer.from_base(api.base_url)))
+    dp = main.create_dispatcher()
+    test = LoadTest(args, dp, bot, api)
+    test.install_probe()
+
+    users = list(range(100_000, 100_000 + args.users))
+    try:
+        await dp.emit_startup(bot=bot)
+        # Registration, not measured as traffic
+        await test.run_users(users, lambda uid: test.feed("start", message_update(uid, "/start")))
+        await seed_expenses(users, args.seed_expenses, test.rng)
+
+        elapsed = await test.run_users(users, test.virtual_user)
+    finally:
+        await dp.emit_shutdown()
+        await bot.session.close()
+        await api.close()
+        await engine.dispose()
+
+    return build_report(test, elapsed)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="spender_loadtest_") as tmp_dir:
+        configure_env(args, tmp_dir)
+        report = asyncio.run(run(args))
+
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
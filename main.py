@@ -2,21 +2,77 @@ import asyncio
 import logging
 import sys
 
+from aiohttp import web
 from aiogram import Bot, html, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.base import BaseSession
 from aiogram.enums import ParseMode
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
 from core.config import settings
-from bot.handlers import start_router, expenses_router, echo_router, stats_router, settings_router, main_menu_router, history_router
+from db.models import engine
+from db.fsm_storage import SQLAlchemyStorage
+from bot.handlers import start_router, expenses_router, echo_router, stats_router, settings_router, main_menu_router, history_router, export_router, import_router
+from bot.middlewares.concurrency import ConcurrencyLimitMiddleware
+from bot.middlewares.user_context import UserContextMiddleware
+from bot.middlewares.outbound import OutboundRateLimiter
+from bot.middlewares.metrics import UpdateMetricsMiddleware, HandlerMetricsMiddleware
+from bot.services.metrics import registry, instrument_engine, start_metrics_server
+from bot.services.settings_cache import settings_cache
+from bot.services.digest import DigestScheduler
 
 
-async def main():
+def create_bot(session: BaseSession = None) -> Bot:
+    # `session` lets the load test point the bot at a fake Bot API server
     bot = Bot(
         token=settings.BOT_TOKEN,
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
+    # Every outgoing call is paced per chat and globally, 429s are retried
+    outbound = OutboundRateLimiter(
+        global_rate=settings.OUTBOUND_GLOBAL_RATE,
+        global_burst=settings.OUTBOUND_GLOBAL_BURST,
+        chat_rate=settings.OUTBOUND_CHAT_RATE,
+        chat_burst=settings.OUTBOUND_CHAT_BURST,
+        max_retries=settings.OUTBOUND_MAX_RETRIES,
+    )
+    bot.session.middleware(outbound)
+    registry.add_source("spender_outbound", outbound.stats)
+    return bot
+
+
+def create_storage() -> BaseStorage:
+    if settings.FSM_STORAGE == "memory":
+        return MemoryStorage()
+
+    return SQLAlchemyStorage(
+        state_ttl=settings.FSM_STATE_TTL,
+        cache_ttl=settings.FSM_CACHE_TTL,
+        expiry_batch=settings.FSM_EXPIRY_BATCH,
+    )
+
+
+def create_dispatcher() -> Dispatcher:
+    storage = create_storage()
+    dp = Dispatcher(storage=storage)
 
-    dp = Dispatcher()
+    if settings.METRICS_ENABLED:
+        instrument_engine(engine)
+        registry.add_source("spender_settings_cache", settings_cache.stats)
+        # Outermost, so the time spent waiting for the limiter is counted too
+        dp.update.outer_middleware(UpdateMetricsMiddleware())
+        # Inner ones see which handler was picked, in any included router
+        dp.message.middleware(HandlerMetricsMiddleware())
+        dp.callback_query.middleware(HandlerMetricsMiddleware())
+
+    # Outer middlewares run in order: limit first, then load the user context
+    limiter = ConcurrencyLimitMiddleware(settings.MAX_CONCURRENT_UPDATES)
+    dp.update.outer_middleware(limiter)
+    # Loads User + UserSettings once per update and passes them as `user_settings`
+    dp.update.outer_middleware(UserContextMiddleware())
 
     # Routers connection
     dp.include_router(start_router)
@@ -24,13 +80,108 @@ async def main():
     dp.include_router(expenses_router)
     dp.include_router(settings_router)
     dp.include_router(history_router)
+    dp.include_router(import_router)
     # Обычные роутеры после FSM
     dp.include_router(main_menu_router)
     dp.include_router(stats_router)
+    dp.include_router(export_router)
     dp.include_router(echo_router)
 
-    await dp.start_polling(bot)
+    digests = None
+
+    async def on_startup(bot: Bot):
+        nonlocal digests
+        if isinstance(storage, SQLAlchemyStorage):
+            storage.start_expiry(settings.FSM_EXPIRY_INTERVAL)
+        if settings.DIGEST_ENABLED:
+            digests = DigestScheduler(bot)
+            digests.start()
+
+    async def on_shutdown():
+        if digests:
+            await digests.close()
+        # Let in-flight updates finish before the DB goes away
+        await limiter.wait_idle(settings.SHUTDOWN_TIMEOUT)
+        await storage.close()
+        await engine.dispose()
+
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    return dp
+
+
+async def run_polling():
+    bot = create_bot()
+    dp = create_dispatcher()
+
+    runner = None
+    if settings.METRICS_ENABLED:
+        runner = await start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT, settings.METRICS_PATH)
+
+    try:
+        # getUpdates doesn't work while a webhook is set
+        await bot.delete_webhook()
+        await dp.start_polling(bot, tasks_concurrency_limit=settings.MAX_CONCURRENT_UPDATES)
+    finally:
+        if runner:
+            await runner.cleanup()
+
+
+def run_webhook():
+    bot = create_bot()
+    dp = create_dispatcher()
+
+    async def on_startup(bot: Bot):
+        await bot.set_webhook(
+            f"{settings.WEBHOOK_BASE_URL}{settings.WEBHOOK_PATH}",
+            secret_token=settings.WEBHOOK_SECRET or None,
+            max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+
+    dp.startup.register(on_startup)
+
+    app = web.Application()
+    # Dispatcher shutdown (drain + engine dispose) must run before the
+    # request handler closes the bot session, so it is set up first
+    setup_application(app, dp, bot=bot)
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=settings.WEBHOOK_SECRET or None,
+        handle_in_background=True,
+    ).register(app, path=settings.WEBHOOK_PATH)
+    if settings.METRICS_ENABLED:
+        # Not on the webhook app: that one is public, metrics stay local
+        metrics_runner = None
+
+        async def start_metrics(app: web.Application):
+            nonlocal metrics_runner
+            metrics_runner = await start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT, settings.METRICS_PATH)
+
+        async def stop_metrics(app: web.Application):
+            if metrics_runner:
+                await metrics_runner.cleanup()
+
+        app.on_startup.append(start_metrics)
+        app.on_cleanup.append(stop_metrics)
+
+    # Several workers can run behind a reverse proxy, each on its own port
+    web.run_app(
+        app,
+        host=settings.WEBAPP_HOST,
+        port=settings.WEBAPP_PORT,
+        shutdown_timeout=settings.SHUTDOWN_TIMEOUT,
+    )
+
+
+def main():
+    if settings.RUN_MODE == "webhook":
+        run_webhook()
+    else:
+        asyncio.run(run_polling())
+
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO, stream=sys.stdout)
-    asyncio.run(main())
+    main()
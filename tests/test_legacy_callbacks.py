@@ -0,0 +1,52 @@
+"""Buttons from before the category migration carry names, not ids ("cat:Food")."""
+import asyncio
+import os
+from unittest.mock import AsyncMock, MagicMock
+
+os.environ.setdefault("BOT_TOKEN", "42:TEST")
+
+from bot.callbacks import callback_id
+from bot.handlers.expenses import choose_category
+from bot.handlers.settings import delete_cat_cb
+from bot.i18n import t
+from bot.services.settings_cache import SettingsSnapshot, CategoryRef
+
+SETTINGS = SettingsSnapshot(
+    user_id=1, currency="$", categories=(CategoryRef(1, "Food"),),
+    limit=None, notifications=True, language="en",
+)
+
+
+def make_callback(data: str):
+    callback = MagicMock()
+    callback.data = data
+    callback.from_user.id = SETTINGS.user_id
+    callback.answer = AsyncMock()
+    callback.message.edit_text = AsyncMock()
+    return callback
+
+
+def test_callback_id():
+    assert callback_id("cat:12") == 12
+    assert callback_id("cat:Food") is None
+    assert callback_id("cat_del:") is None
+    assert callback_id("cat:١٢") is None
+
+
+def test_choose_category_with_legacy_data():
+    callback = make_callback("cat:Food")
+    state = AsyncMock()
+
+    asyncio.run(choose_category(callback, state, SETTINGS))
+
+    callback.answer.assert_awaited_once_with(t("en", "category_not_found"), show_alert=True)
+    state.update_data.assert_not_awaited()
+
+
+def test_delete_category_with_legacy_data():
+    callback = make_callback("cat_del:Food")
+
+    asyncio.run(delete_cat_cb(callback, SETTINGS))
+
+    callback.answer.assert_awaited_once_with(t("en", "category_not_found"), show_alert=True)
+    callback.message.edit_text.assert_not_awaited()